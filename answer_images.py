@@ -0,0 +1,81 @@
+"""
+Inline images in answer HTML
+The drawing tool embeds canvas PNGs in the Quill editor as base64 data URIs. They are
+decoded into content-addressed files on submit, so answer_text keeps only a short
+<img> reference and the grader gets the pictures as image parts instead of prompt text
+"""
+
+import base64
+import binascii
+import html
+import re
+
+from upload_store import is_content_addressed, store_bytes
+
+DATA_URI_EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'jpg': '.jpg', 'gif': '.gif', 'webp': '.webp'}
+
+# <img ... src="data:image/png;base64,...">, as Quill serializes embedded images
+DATA_URI_IMG_RE = re.compile(
+    r'<img\b[^>]*?\bsrc=(?P<quote>["\'])data:image/(?P<type>[a-z]+);base64,(?P<data>[^"\'>]*)(?P=quote)[^>]*>',
+    re.IGNORECASE
+)
+# References left by extract_inline_images
+STORED_IMG_RE = re.compile(r'<img\b[^>]*?\bdata-answer-image="(?P<name>[0-9a-f]{64}\.[a-z]+)"[^>]*>')
+# Any image, for prompt text; covers old rows that still hold data URIs
+ANY_IMG_RE = re.compile(r'<img\b[^>]*>', re.IGNORECASE)
+
+
+def extract_inline_images(text, folder, max_bytes, max_images, url_prefix):
+    """
+    Store the data-URI images of an answer and point the <img> tags at the stored files
+    Images that are undecodable, too large, of an unknown type or beyond max_images are dropped
+    Returns (answer html, [stored filenames])
+    """
+    if not text or 'data:image/' not in text:
+        return text, []
+
+    filenames = []
+
+    def replace(match):
+        extension = DATA_URI_EXTENSIONS.get(match.group('type').lower())
+        if extension is None or len(filenames) >= max_images:
+            return ''
+        encoded = match.group('data')
+        # Skip decoding when the base64 length alone is over the limit
+        if max_bytes and len(encoded) * 3 // 4 > max_bytes + 3:
+            return ''
+        try:
+            data = base64.b64decode(re.sub(r'\s+', '', encoded), validate=True)
+        except (binascii.Error, ValueError):
+            return ''
+        if not data or (max_bytes and len(data) > max_bytes):
+            return ''
+        filename = store_bytes(data, extension, folder)
+        filenames.append(filename)
+        src = html.escape(url_prefix + filename)
+        return f'<img src="{src}" data-answer-image="{filename}">'
+
+    return DATA_URI_IMG_RE.sub(replace, text), filenames
+
+
+def answer_image_refs(text):
+    """Stored filenames referenced by an answer, in order of appearance"""
+    if not text or 'data-answer-image' not in text:
+        return []
+    return [name for name in STORED_IMG_RE.findall(text) if is_content_addressed(name)]
+
+
+def strip_images(text):
+    """Replace every <img> with a numbered [image N] marker matching the attached image parts"""
+    if not text or '<img' not in text.lower():
+        return text
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if STORED_IMG_RE.match(match.group(0)):
+            count += 1
+            return f' [image {count}] '
+        return ' [image] '
+
+    return ANY_IMG_RE.sub(replace, text)
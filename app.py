@@ -3,32 +3,249 @@ UNEC Exam Simulator - Flask Application
 An AI-powered exam system with automatic grading using Google Gemini API
 """
 
+import base64
+import functools
+import hashlib
+import json
 import os
 import random
 import re
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import sqlite3
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError, as_completed
+from datetime import datetime, timedelta
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from flask import (Flask, Request, Response, render_template, request, redirect, url_for, session, flash, jsonify,
+                   abort, g, make_response, stream_with_context, before_render_template, template_rendered)
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import joinedload
-from werkzeug.utils import secure_filename
+from sqlalchemy import event, inspect, or_, and_, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, joinedload, load_only
 from markupsafe import Markup
-import google.generativeai as genai
+from werkzeug.exceptions import RequestEntityTooLarge
 from PIL import Image
+from answer_images import answer_image_refs, extract_inline_images, strip_images
+from gemini_clients import (GeminiClientPool, KeyCheckUnavailable, KeyValidationError, KeyValidator, classify_error,
+                            key_fingerprint, retry_after)
+from grading_scheduler import GradingScheduler
+from image_prep import prepare_image
+from math_render import render_math
+from metrics import Metrics, server_timing_header
+from text_normalize import normalize_for_ai
+from upload_store import HashingUploadFile, is_content_addressed, store_upload
+from ttl_cache import TTLCache
+
+
+
+def database_engine_options(uri):
+    """
+    Connection pool settings from the environment
+    Server databases get a sized pool by default; SQLite only when sizes are set explicitly
+    """
+    options = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds
+    }
+    is_sqlite = uri.startswith('sqlite')
+    if not is_sqlite or 'DB_POOL_SIZE' in os.environ:
+        options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    if not is_sqlite or 'DB_MAX_OVERFLOW' in os.environ:
+        options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    if 'DB_POOL_TIMEOUT' in os.environ:
+        options['pool_timeout'] = int(os.environ['DB_POOL_TIMEOUT'])
+    return options
+
 
 # Initialize Flask app
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'gizli_açar_bura_yaz')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///exam.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///exam.db').replace(
+    'postgres://', 'postgresql://', 1  # some hosts still hand out the old scheme
+)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = database_engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# SQLite connection settings: WAL lets readers run while a submission is being written
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+app.config['SQLITE_BUSY_TIMEOUT'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000))  # milliseconds
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max request size
+app.config['MAX_UPLOAD_FILE_SIZE'] = int(os.environ.get('MAX_UPLOAD_FILE_SIZE', 8 * 1024 * 1024))  # per image
+# Drawings arrive as data URIs inside the answer fields, so text fields may be larger than werkzeug's 500KB default
+app.config['MAX_FORM_MEMORY_SIZE'] = int(os.environ.get('MAX_FORM_MEMORY_SIZE', 16 * 1024 * 1024))
+app.config['MAX_INLINE_IMAGES'] = int(os.environ.get('MAX_INLINE_IMAGES', 5))  # per answer, extra drawings are dropped
+
+# AI grading concurrency
+app.config['GRADING_MAX_WORKERS'] = int(os.environ.get('GRADING_MAX_WORKERS', 16))
+# seconds per model call; in sync mode also the limit for grading a whole exam, queueing for quota included
+app.config['GRADING_TIMEOUT'] = float(os.environ.get('GRADING_TIMEOUT', 60))
+# In-flight cap, rate and burst are per API key and model across the whole deployment. The scheduler is
+# per process, so each process enforces 1/GRADING_PROCESSES of them: set it to the number of app
+# processes sharing the keys (defaults to gunicorn's WEB_CONCURRENCY). Calls beyond the quota wait in
+# a queue served round-robin across students
+app.config['GRADING_PROCESSES'] = max(1, int(os.environ.get('GRADING_PROCESSES', os.environ.get('WEB_CONCURRENCY', 1))))
+app.config['GRADING_MAX_INFLIGHT_PER_KEY'] = int(os.environ.get('GRADING_MAX_INFLIGHT_PER_KEY', 5))
+app.config['GRADING_RATE_PER_MINUTE'] = float(os.environ.get('GRADING_RATE_PER_MINUTE', 10))  # 0 = unlimited
+app.config['GRADING_RATE_BURST'] = int(os.environ.get('GRADING_RATE_BURST', 5))
+app.config['GRADING_RETRIES'] = int(os.environ.get('GRADING_RETRIES', 3))  # for quota and 5xx errors
+app.config['GRADING_RETRY_BACKOFF'] = float(os.environ.get('GRADING_RETRY_BACKOFF', 2))  # seconds, doubles per retry
+app.config['GRADING_RETRY_BACKOFF_MAX'] = float(os.environ.get('GRADING_RETRY_BACKOFF_MAX', 30))  # seconds
+app.config['GRADING_BATCH_MODE'] = os.environ.get('GRADING_BATCH_MODE', '0') == '1'  # one request per exam
+app.config['AI_TEXT_MAX_CHARS'] = int(os.environ.get('AI_TEXT_MAX_CHARS', 20000))  # longer answers are cut for the prompt
+
+# Background grading queue: 'queue' returns right after submission, 'sync' grades in the request
+app.config['GRADING_MODE'] = os.environ.get('GRADING_MODE', 'queue')
+app.config['GRADING_QUEUE_WORKERS'] = int(os.environ.get('GRADING_QUEUE_WORKERS', 2))
+app.config['GRADING_QUEUE_POLL_INTERVAL'] = float(os.environ.get('GRADING_QUEUE_POLL_INTERVAL', 2))  # seconds
+app.config['GRADING_JOB_STALE_AFTER'] = int(os.environ.get('GRADING_JOB_STALE_AFTER', 600))  # seconds
+app.config['GRADING_JOB_MAX_ATTEMPTS'] = int(os.environ.get('GRADING_JOB_MAX_ATTEMPTS', 3))
+
+# Question selection
+app.config['QUESTION_INDEX_TTL'] = int(os.environ.get('QUESTION_INDEX_TTL', 300))  # seconds
+
+# Dashboard
+app.config['DASHBOARD_PAGE_SIZE'] = int(os.environ.get('DASHBOARD_PAGE_SIZE', 50))
+app.config['DASHBOARD_SUMMARY_TTL'] = int(os.environ.get('DASHBOARD_SUMMARY_TTL', 60))  # seconds, bounds staleness across workers
+
+# Result page: pending results poll /result/<id>/status every 2 s. Server-sent events push grades instead,
+# but every open stream holds a request thread, so only enable them with threaded or async workers
+# (gunicorn --threads N, or -k gthread / gevent); with sync workers a hall of waiting students blocks them all
+app.config['RESULT_EVENTS_ENABLED'] = os.environ.get('RESULT_EVENTS_ENABLED', '0') == '1'
+# Streams end below gunicorn's 30 s worker timeout and the browser reconnects
+app.config['RESULT_EVENTS_MAX_SECONDS'] = int(os.environ.get('RESULT_EVENTS_MAX_SECONDS', 25))
+app.config['RESULT_EVENTS_POLL_INTERVAL'] = float(os.environ.get('RESULT_EVENTS_POLL_INTERVAL', 2))  # seconds, for grades committed by other processes
+app.config['RESULT_EVENTS_KEEPALIVE'] = int(os.environ.get('RESULT_EVENTS_KEEPALIVE', 15))  # seconds
+
+# History
+app.config['HISTORY_PAGE_SIZE'] = int(os.environ.get('HISTORY_PAGE_SIZE', 20))
+
+# Rendered index, history and dashboard pages, revalidated by the browser with ETag / Last-Modified
+app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))  # seconds, bounds staleness across workers
+app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 2048))
+
+# Answer images are downscaled and re-encoded before they are sent to the model
+app.config['IMAGE_MAX_SIDE'] = int(os.environ.get('IMAGE_MAX_SIDE', 1600))  # pixels
+app.config['IMAGE_FORMAT'] = os.environ.get('IMAGE_FORMAT', 'JPEG')  # 'JPEG' or 'WEBP'
+app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY', 80))
+app.config['IMAGE_GRAYSCALE'] = os.environ.get('IMAGE_GRAYSCALE', '0') == '1'
+
+# Gemini model and per-API-key client pool
+app.config['GEMINI_MODEL'] = os.environ.get('GEMINI_MODEL', 'gemini-2.5-flash')
+app.config['GEMINI_CLIENT_POOL_SIZE'] = int(os.environ.get('GEMINI_CLIENT_POOL_SIZE', 256))
+app.config['GEMINI_CLIENT_IDLE_TTL'] = int(os.environ.get('GEMINI_CLIENT_IDLE_TTL', 1800))  # seconds
+
+# API key validation: keys that passed are trusted for a while, failing keys back off exponentially
+app.config['API_KEY_VALIDATION_TTL'] = int(os.environ.get('API_KEY_VALIDATION_TTL', 3600))  # seconds
+app.config['API_KEY_VALIDATION_TIMEOUT'] = float(os.environ.get('API_KEY_VALIDATION_TIMEOUT', 10))  # seconds
+app.config['API_KEY_FAILURE_BACKOFF'] = float(os.environ.get('API_KEY_FAILURE_BACKOFF', 2))  # seconds, doubles per failure
+app.config['API_KEY_FAILURE_BACKOFF_MAX'] = float(os.environ.get('API_KEY_FAILURE_BACKOFF_MAX', 300))  # seconds
+
+# Grading cache for repeated answers to the same question
+app.config['GRADE_CACHE_ENABLED'] = os.environ.get('GRADE_CACHE_ENABLED', '1') == '1'
+app.config['GRADE_CACHE_TTL'] = int(os.environ.get('GRADE_CACHE_TTL', 7 * 24 * 3600))  # seconds
+app.config['GRADE_CACHE_MAX_ENTRIES'] = int(os.environ.get('GRADE_CACHE_MAX_ENTRIES', 20000))
+
+# Metrics: /metrics is always on, Server-Timing headers on request
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', '0') == '1'
 
 # Create upload folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+
+
+class ExamRequest(Request):
+    """Request that streams uploaded files to hashed temp files in the upload folder"""
+
+    @property
+    def max_form_memory_size(self):
+        return app.config['MAX_FORM_MEMORY_SIZE']
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        upload = HashingUploadFile(app.config['UPLOAD_FOLDER'], app.config['MAX_UPLOAD_FILE_SIZE'])
+        self.upload_files.append(upload)
+        return upload
+
+    @functools.cached_property
+    def upload_files(self):
+        """Every upload temp file of this request, including parts of a form that failed to parse"""
+        return []
+
+
+app.request_class = ExamRequest
+
+
+@app.teardown_request
+def remove_upload_temp_files(error=None):
+    """Delete upload temp files that were not stored, e.g. after an oversized or aborted form"""
+    for upload in request.upload_files:
+        upload.close()
+
+
+@event.listens_for(Engine, 'connect')
+def configure_sqlite_connection(dbapi_connection, connection_record):
+    """Apply the configured journal mode, sync level and busy timeout to new SQLite connections"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    journal_mode = app.config['SQLITE_JOURNAL_MODE']
+    synchronous = app.config['SQLITE_SYNCHRONOUS']
+    if journal_mode not in ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'):
+        raise ValueError(f"Unknown SQLITE_JOURNAL_MODE: {journal_mode}")
+    if synchronous not in ('OFF', 'NORMAL', 'FULL', 'EXTRA'):
+        raise ValueError(f"Unknown SQLITE_SYNCHRONOUS: {synchronous}")
+    
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(app.config['SQLITE_BUSY_TIMEOUT'])}")
+    cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+    cursor.execute(f"PRAGMA synchronous = {synchronous}")
+    cursor.close()
+
 # Initialize database
 db = SQLAlchemy(app)
 
+# Shared workers for AI grading calls, rate limited per API key and model; threads start on first use.
+# This process gets its share of each key's limits
+grading_scheduler = GradingScheduler(
+    workers=app.config['GRADING_MAX_WORKERS'],
+    rate=app.config['GRADING_RATE_PER_MINUTE'] / 60 / app.config['GRADING_PROCESSES'],
+    burst=max(1, app.config['GRADING_RATE_BURST'] // app.config['GRADING_PROCESSES']),
+    max_running=max(1, app.config['GRADING_MAX_INFLIGHT_PER_KEY'] // app.config['GRADING_PROCESSES']),
+    retries=app.config['GRADING_RETRIES'],
+    backoff=app.config['GRADING_RETRY_BACKOFF'],
+    max_backoff=app.config['GRADING_RETRY_BACKOFF_MAX'],
+    classify=classify_error,
+    retry_after=retry_after,
+    on_wait=lambda seconds: metrics.observe('grading_queue_wait_seconds', seconds)
+)
+
+# Configured Gemini clients, reused across requests
+gemini_clients = GeminiClientPool(
+    app.config['GEMINI_MODEL'],
+    max_size=app.config['GEMINI_CLIENT_POOL_SIZE'],
+    idle_ttl=app.config['GEMINI_CLIENT_IDLE_TTL'],
+    timeout=app.config['GRADING_TIMEOUT']  # bounds each running call; transient timeouts are retried
+)
+
+# Recently validated and recently rejected API keys
+key_validator = KeyValidator(
+    lambda api_key: gemini_clients.check_key(api_key, timeout=app.config['API_KEY_VALIDATION_TIMEOUT']),
+    ttl=app.config['API_KEY_VALIDATION_TTL'],
+    backoff=app.config['API_KEY_FAILURE_BACKOFF'],
+    max_backoff=app.config['API_KEY_FAILURE_BACKOFF_MAX']
+)
+
+# Counters and timing histograms served at /metrics
+metrics = Metrics('exam')
+metrics.describe('grading_seconds', 'AI grading time by stage: image, model, parse, and answers for a whole exam')
+metrics.describe('grading_fallbacks_total', 'Answers the AI did not grade, by reason; sync mode stores a placeholder, '
+                                           'queue mode retries the job')
+metrics.describe('grading_queue_wait_seconds', 'Time grading calls spent queued for their API key quota')
+metrics.describe('inline_images_total', 'Drawings decoded from answer HTML into stored image files')
+metrics.describe('db_seconds', 'Session flush and commit time')
+
 
 # ============================================================================
 # TEMPLATE FILTERS
@@ -67,12 +284,31 @@ class Question(db.Model):
     text = db.Column(db.Text, nullable=False)
     difficulty = db.Column(db.String(20), nullable=False)  # 'Easy', 'Medium', 'Hard'
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    key = db.Column(db.String(64), nullable=True, unique=True, index=True)  # stable import key, see question_import.py
+    text_html = db.Column(db.Text, nullable=True)  # text with math pre-rendered to MathML, NULL = typeset with MathJax
+    ai_text = db.Column(db.Text, nullable=True)  # clean_for_ai(text), ready for grading prompts
     answers = db.relationship('Answer', backref='question', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_question_subject_difficulty', 'subject_id', 'difficulty'),
+    )
+
+    @property
+    def html(self):
+        """Markup to show for the question: pre-rendered when available, raw LaTeX otherwise"""
+        return self.text_html or self.text
+
     def __repr__(self):
         return f'<Question {self.id}: {self.difficulty}>'
 
 
+@event.listens_for(Question.text, 'set')
+def derive_question_text(question, value, oldvalue, initiator):
+    """Keep the pre-rendered markup and prompt text in step with edits made through the ORM"""
+    question.text_html = render_math(value)
+    question.ai_text = clean_for_ai(value)
+
+
 class Result(db.Model):
     """Exam result model"""
     id = db.Column(db.Integer, primary_key=True)
@@ -80,8 +316,15 @@ class Result(db.Model):
     subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
     total_score = db.Column(db.Integer, nullable=False, default=0)
     exam_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    status = db.Column(db.String(20), nullable=False, default='graded', server_default='graded')  # 'pending', 'graded', 'failed'
+    question_seed = db.Column(db.BigInteger, nullable=True)  # seed the exam's questions were drawn with
     answers = db.relationship('Answer', backref='result', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('ix_result_username_exam_date', 'username', 'exam_date'),  # history
+        db.Index('ix_result_status_exam_date', 'status', 'exam_date', 'id'),  # dashboard
+    )
+
     def __repr__(self):
         return f'<Result {self.username}: {self.total_score}>'
 
@@ -89,44 +332,149 @@ class Result(db.Model):
 class Answer(db.Model):
     """Individual answer model"""
     id = db.Column(db.Integer, primary_key=True)
-    result_id = db.Column(db.Integer, db.ForeignKey('result.id'), nullable=False)
-    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    result_id = db.Column(db.Integer, db.ForeignKey('result.id'), nullable=False, index=True)
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True)
     answer_text = db.Column(db.Text, nullable=True)
     image_path = db.Column(db.String(200), nullable=True)
     points = db.Column(db.Integer, nullable=False, default=0)
     max_points = db.Column(db.Integer, nullable=False, default=10)
     feedback = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='graded', server_default='graded')  # 'pending', 'graded', 'failed'
 
     def __repr__(self):
         return f'<Answer {self.points}/{self.max_points}>'
 
 
+class GradingJob(db.Model):
+    """Durable queue entry for grading one submitted Result in the background"""
+    id = db.Column(db.Integer, primary_key=True)
+    result_id = db.Column(db.Integer, db.ForeignKey('result.id'), nullable=False)
+    # The student's Gemini key, encrypted with a key derived from SECRET_KEY (seal_api_key) so that any
+    # worker process can grade the job but a database dump holds no usable keys; cleared once the job
+    # is done or has failed for good
+    api_key = db.Column(db.String(200), nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    result = db.relationship('Result')
+
+    __table_args__ = (
+        db.Index('ix_grading_job_status_id', 'status', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<GradingJob {self.id}: {self.status}>'
+
+
+class GradeCache(db.Model):
+    """Cached AI feedback keyed on question, model, prompt version, normalized answer and image content"""
+    key = db.Column(db.String(64), primary_key=True)  # sha256 hex digest
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False)
+    feedback = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<GradeCache {self.key[:12]}: question {self.question_id}>'
+
+
+class QuestionStat(db.Model):
+    """Running totals over the graded answers to a question, updated as results are graded"""
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    answers = db.Column(db.Integer, nullable=False, default=0)
+    points_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    points_sq_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    max_points_sum = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<QuestionStat {self.question_id}: {self.answers} answers>'
+
+
+class SubjectStat(db.Model):
+    """Running totals over the graded results of a subject"""
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), primary_key=True)
+    results = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    score_sq_sum = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SubjectStat {self.subject_id}: {self.results} results>'
+
+
+class ScoreCount(db.Model):
+    """Score histograms: answers per points value of a question, results per total score of a subject"""
+    scope = db.Column(db.String(10), primary_key=True)  # 'question', 'subject'
+    scope_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ScoreCount {self.scope} {self.scope_id}: {self.score} x{self.count}>'
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
-def get_exam_questions(subject_id):
+# UNEC exam format: number of questions drawn per difficulty, in display order
+EXAM_FORMAT = (('Easy', 2), ('Medium', 2), ('Hard', 1))
+
+_question_index = {}  # (subject_id, difficulty) -> sorted question ids
+_question_index_built_at = None
+_question_index_lock = threading.Lock()
+
+
+def get_question_index():
+    """
+    Question ids grouped by (subject_id, difficulty), built from one id-only query
+    Rebuilt after questions are committed, and after QUESTION_INDEX_TTL for other worker processes
+    """
+    global _question_index, _question_index_built_at
+    with _question_index_lock:
+        if (_question_index_built_at is not None
+                and time.monotonic() - _question_index_built_at < app.config['QUESTION_INDEX_TTL']):
+            return _question_index
+        
+        index = {}
+        for question_id, subject_id, difficulty in db.session.query(
+            Question.id, Question.subject_id, Question.difficulty
+        ).order_by(Question.id):
+            index.setdefault((subject_id, difficulty), []).append(question_id)
+        
+        _question_index = index
+        _question_index_built_at = time.monotonic()
+        return index
+
+
+def invalidate_question_index():
+    global _question_index_built_at
+    with _question_index_lock:
+        _question_index_built_at = None
+
+
+def get_exam_questions(subject_id, seed=None):
     """
     Get exam questions in UNEC format: 2 Easy, 2 Medium, 1 Hard
     Returns questions ordered by difficulty: Easy first, then Medium, then Hard
+    The same seed draws the same questions as long as the question bank is unchanged
     """
     try:
-        easy_all = Question.query.filter_by(subject_id=subject_id, difficulty='Easy').all()
-        medium_all = Question.query.filter_by(subject_id=subject_id, difficulty='Medium').all()
-        hard_all = Question.query.filter_by(subject_id=subject_id, difficulty='Hard').all()
-        
-        random.shuffle(easy_all)
-        random.shuffle(medium_all)
-        random.shuffle(hard_all)
-        
-        easy = easy_all[:2]
-        medium = medium_all[:2]
-        hard = hard_all[:1]
-        
-        questions = easy + medium + hard
-        # Questions ordered by difficulty: Easy first, then Medium, then Hard
-        
-        return questions
+        with metrics.timer('question_selection_seconds', timing='questions'):
+            index = get_question_index()
+            rng = random.Random(seed)
+            
+            question_ids = []
+            for difficulty, count in EXAM_FORMAT:
+                pool = index.get((subject_id, difficulty), [])
+                question_ids += rng.sample(pool, min(count, len(pool)))
+            
+            # Fetch only the chosen rows, keeping the drawn order
+            rows = {q.id: q for q in Question.query.filter(Question.id.in_(question_ids))}
+            return [rows[q_id] for q_id in question_ids if q_id in rows]
     except Exception as e:
         app.logger.error(f"Error getting exam questions: {e}")
         return []
@@ -135,38 +483,36 @@ def get_exam_questions(subject_id):
 def clean_for_ai(text):
     """
     Clean LaTeX and text for AI processing
-    Converts LaTeX delimiters to $$ format and removes backslashes
+    Converts LaTeX delimiters to $$ format and removes backslashes, see text_normalize.py
     """
-    if not text:
-        return ""
-    
-    # Convert LaTeX delimiters to $$
-    text = re.sub(r'\\\((.*?)\\\)', r'$\1$', text)  # \(...\) -> $...$
-    text = re.sub(r'\\\[(.*?)\\\]', r'$\1$', text)  # \[...\] -> $...$
-    
-    # Remove all backslashes
-    text = re.sub(r'\\', '', text)
-    
-    # Clean up extra spaces
-    text = re.sub(r'\s+', ' ', text)
-    
-    return text.strip()
+    return normalize_for_ai(text, app.config['AI_TEXT_MAX_CHARS'])
+
+
+def question_ai_text(question):
+    """Question text ready for the prompt, normalized once when the question was stored"""
+    return question.ai_text if question.ai_text is not None else clean_for_ai(question.text)
+
 
+# Part of the grading cache key: bump whenever the grading prompts or their parsing change
+GRADING_PROMPT_VERSION = 1
 
-def ai_grade_answer(question_text, student_answer, image_path=None, api_key=None):
+
+class GradeParseError(ValueError):
+    """The model replied without a recognizable score; the answer counts as not graded"""
+
+
+def request_ai_grade(question_text, student_answer, image_path, api_key):
     """
     Grade student answer using Google Gemini AI
-    Returns formatted feedback with score and comments
+    question_text is already normalized (question_ai_text), the answer is cleaned here
+    Returns formatted feedback with score and comments, raises on API errors
+    and GradeParseError when the reply has no score
     """
-    if not api_key:
-        return "Xal: 0\nRəy: API açarı tapılmadı."
+    clean_question = question_text
+    clean_answer = clean_for_ai(strip_images(student_answer))
     
-    try:
-        clean_question = clean_for_ai(question_text)
-        clean_answer = clean_for_ai(student_answer)
-        
-        # Detailed grading prompt
-        prompt = f"""
+    # Detailed grading prompt
+    prompt = f"""
 Grade this mathematics answer based on the following criteria:
 
 Question: {clean_question}
@@ -185,41 +531,397 @@ Format your response as:
 Score: X/10
 Feedback: [brief explanation]
 """
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        if image_path:
-            full_path = os.path.join(app.config['UPLOAD_FOLDER'], image_path)
-            if os.path.exists(full_path):
-                try:
-                    image = Image.open(full_path)
-                    response = model.generate_content([prompt, image])
-                except Exception as img_error:
-                    app.logger.error(f"Error processing image: {img_error}")
-                    response = model.generate_content(prompt)
-            else:
-                response = model.generate_content(prompt)
+    
+    model = gemini_clients.get_model(api_key)
+    
+    with metrics.timer('grading_seconds', stage='image'):
+        images = open_answer_images(student_answer, image_path)
+    with metrics.timer('grading_seconds', stage='model'):
+        if images:
+            response = model.generate_content([prompt, *images])
         else:
             response = model.generate_content(prompt)
-        
+    
+    with metrics.timer('grading_seconds', stage='parse'):
         # Parse the response
         response_text = response.text.strip()
         
         # Extract score (0-10)
         score_match = re.search(r'Score:\s*(\d+)/10', response_text, re.IGNORECASE)
-        score = int(score_match.group(1)) if score_match else 5
-        score = max(0, min(10, score))  # Ensure score is between 0-10
+        if not score_match:
+            # A made-up default would be stored, cached and shown as a real grade
+            raise GradeParseError("AI cavabında xal tapılmadı")
+        score = max(0, min(10, int(score_match.group(1))))  # Ensure score is between 0-10
         
         # Extract feedback
         feedback_match = re.search(r'Feedback:\s*(.+)', response_text, re.IGNORECASE | re.DOTALL)
         feedback = feedback_match.group(1).strip() if feedback_match else response_text
-        
-        return f"Xal: {score}\nRəy: {feedback}"
-        
-    except Exception as e:
-        app.logger.error(f"Error in AI grading: {e}")
-        return f"Xal: 5\nRəy: Cavab qiymətləndirilə bilmədi: {str(e)}"
+    
+    return f"Xal: {score}\nRəy: {feedback}"
+
+
+def request_ai_grade_batch(items, api_key):
+    """
+    Grade all answers of one exam with a single Gemini request
+    items: list of (question_id, question_text, student_answer, image_path) tuples,
+    with question_text already normalized
+    Returns a list aligned with items holding formatted feedback, or None where
+    the model's JSON reply had no usable entry for that question
+    """
+    parts = ["""
+Grade each of the following mathematics answers based on these criteria:
+
+1. Mathematical Correctness (40%): Is the math accurate and correct?
+2. Completeness (30%): Does the answer fully address the question?
+3. Logical Reasoning (20%): Is the reasoning sound and well-structured?
+4. Clarity of Explanation (10%): Is the answer clearly expressed?
+
+Give every answer a score from 0-10 and brief feedback.
+"""]
+    
+    for question_id, question_text, student_answer, image_path in items:
+        parts.append(f"""
+---
+question_id: {question_id}
+Question: {question_text}
+Student Answer: {clean_for_ai(strip_images(student_answer))}
+""")
+        with metrics.timer('grading_seconds', stage='image'):
+            image = open_answer_image(image_path)
+            drawings = [open_answer_image(name) for name in answer_image_refs(student_answer)]
+        if image is not None:
+            parts.append(f"Attached image for question_id {question_id}:")
+            parts.append(image)
+        for number, drawing in enumerate(drawings, start=1):
+            if drawing is not None:
+                parts.append(f"[image {number}] in the answer to question_id {question_id}:")
+                parts.append(drawing)
+    
+    parts.append("""
+---
+Respond with only a JSON array, one object per question, in this format:
+[{"question_id": 1, "score": 7, "feedback": "brief explanation"}]
+""")
+    
+    model = gemini_clients.get_model(api_key)
+    with metrics.timer('grading_seconds', stage='model'):
+        response = model.generate_content(parts)
+    with metrics.timer('grading_seconds', stage='parse'):
+        grades = parse_batch_grades(response.text)
+    
+    feedbacks = []
+    for question_id, *_ in items:
+        grade = grades.get(question_id)
+        feedbacks.append(f"Xal: {grade[0]}\nRəy: {grade[1]}" if grade else None)
+    missing = feedbacks.count(None)
+    if missing:
+        metrics.inc('grading_fallbacks_total', missing, reason='batch_entry_missing')
+    return feedbacks
+
+
+def parse_batch_grades(response_text):
+    """Parse the JSON array of a batch grading reply into {question_id: (score, feedback)}"""
+    start, end = response_text.find('['), response_text.rfind(']')
+    if start == -1 or end < start:
+        return {}
+    try:
+        entries = json.loads(response_text[start:end + 1])
+    except ValueError as e:
+        app.logger.error(f"Error parsing batch grading reply: {e}")
+        return {}
+    
+    grades = {}
+    for entry in entries:
+        try:
+            question_id = int(entry['question_id'])
+            score = max(0, min(10, int(entry['score'])))  # Ensure score is between 0-10
+            feedback = str(entry['feedback']).strip()
+        except (KeyError, TypeError, ValueError):
+            continue
+        grades[question_id] = (score, feedback)
+    return grades
+
+
+def open_answer_image(image_path):
+    """
+    Open the preprocessed copy of an uploaded answer image
+    Returns None if the image is missing or unreadable
+    """
+    if not image_path:
+        return None
+    full_path = os.path.join(app.config['UPLOAD_FOLDER'], image_path)
+    if not os.path.exists(full_path):
+        return None
+    try:
+        prepared_path = prepare_image(
+            full_path,
+            max_side=app.config['IMAGE_MAX_SIDE'],
+            fmt=app.config['IMAGE_FORMAT'],
+            quality=app.config['IMAGE_QUALITY'],
+            grayscale=app.config['IMAGE_GRAYSCALE']
+        )
+        image = Image.open(prepared_path)
+        image.load()
+        return image
+    except Exception as img_error:
+        app.logger.error(f"Error processing image: {img_error}")
+        return None
+
+
+def open_answer_images(student_answer, image_path=None):
+    """
+    Images sent along with an answer: the uploaded file first, then the drawings
+    referenced in the answer HTML in the order of their [image N] markers
+    """
+    names = ([image_path] if image_path else []) + answer_image_refs(student_answer)
+    return [image for image in map(open_answer_image, names) if image is not None]
+
+
+NO_API_KEY_FEEDBACK = "Xal: 0\nRəy: API açarı tapılmadı."
+GRADING_FAILED_FEEDBACK = "Xal: 0\nRəy: Cavab bir neçə cəhddən sonra qiymətləndirilə bilmədi."
+GRADING_TIMEOUT_FEEDBACK = "Xal: 5\nRəy: Cavab qiymətləndirilə bilmədi: vaxt limiti aşıldı"
+
+
+def grading_error_feedback(error):
+    """Placeholder feedback used when the AI could not grade an answer"""
+    return f"Xal: 5\nRəy: Cavab qiymətləndirilə bilmədi: {str(error)}"
+
+
+def grading_error_reason(error):
+    """grading_fallbacks_total reason for a failed grading call"""
+    return 'score_not_found' if isinstance(error, GradeParseError) else 'error'
+
+
+def grading_lane(api_key):
+    """Scheduler lane of an API key: its quota is per key and model"""
+    return key_fingerprint(api_key), gemini_clients.model_name
+
+
+def grade_answers_concurrently(items, api_key, on_graded=None, use_cache=True, student=None, placeholders=True):
+    """
+    Grade several answers in parallel on the shared grading scheduler
+    items: list of (question_id, question_text, student_answer, image_path) tuples
+    on_graded: optional callback(index, feedback) called as each answer finishes
+    use_cache: set to False to skip cached feedback, e.g. when re-grading
+    student: whose queue the calls join, so one large submission cannot hold up others
+    placeholders: True inside a request: the exam gets GRADING_TIMEOUT in total, queueing
+    included, and answers that failed or ran out of time get placeholder feedback. False
+    for background grading: calls wait for their key's quota as long as it takes and
+    answers that could not be graded are left as None
+    Returns AI feedback strings in the same order as items
+    """
+    with metrics.timer('grading_seconds', timing='grade', stage='answers'):
+        return _grade_answers(items, api_key, on_graded, use_cache, student, placeholders)
+
+
+def _grade_answers(items, api_key, on_graded, use_cache, student, placeholders):
+    # Running calls are bounded by the Gemini client timeout either way, see GeminiClientPool.
+    # In sync mode the batch call and the per-answer calls share one deadline for the whole exam
+    deadline = time.monotonic() + app.config['GRADING_TIMEOUT'] if placeholders else None
+    feedbacks = [None] * len(items)
+
+    def time_left():
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def schedule(fn, *args):
+        lane = grading_lane(api_key)
+        return grading_scheduler.submit(
+            functools.partial(fn, *args, api_key),
+            student=student or lane[0],
+            lane=lane,
+            deadline=deadline
+        )
+
+    cache_keys = [grade_cache_key(*item) for item in items]
+    if use_cache and app.config['GRADE_CACHE_ENABLED']:
+        cached = lookup_grade_cache(cache_keys)
+        for index, key in enumerate(cache_keys):
+            if key in cached:
+                feedbacks[index] = cached[key]
+                if on_graded:
+                    on_graded(index, feedbacks[index])
+
+    if not api_key:
+        for index, feedback in enumerate(feedbacks):
+            if feedback is None:
+                metrics.inc('grading_fallbacks_total', reason='no_api_key')
+                feedbacks[index] = NO_API_KEY_FEEDBACK
+                if on_graded:
+                    on_graded(index, feedbacks[index])
+        return feedbacks
+
+    fresh = {}
+
+    # Batch mode: one request for the whole exam, per-answer calls only for entries it missed
+    pending = [index for index, feedback in enumerate(feedbacks) if feedback is None]
+    if app.config['GRADING_BATCH_MODE'] and len(pending) > 1:
+        future = schedule(request_ai_grade_batch, [items[index] for index in pending])
+        try:
+            batch_feedbacks = future.result(timeout=time_left())
+        except FutureTimeoutError:
+            future.cancel()
+            app.logger.error("Batch AI grading timed out")
+            batch_feedbacks = [None] * len(pending)
+        except Exception as e:
+            app.logger.error(f"Error in batch AI grading: {e}")
+            batch_feedbacks = [None] * len(pending)
+        for index, feedback in zip(pending, batch_feedbacks):
+            if feedback is None:
+                continue
+            feedbacks[index] = feedback
+            fresh[cache_keys[index]] = (items[index][0], feedback)
+            if on_graded:
+                on_graded(index, feedback)
+
+    futures = {
+        schedule(request_ai_grade, *item[1:]): index
+        for index, item in enumerate(items) if feedbacks[index] is None
+    }
+
+    try:
+        for future in as_completed(futures, timeout=time_left()):
+            index = futures[future]
+            try:
+                feedbacks[index] = future.result()
+                fresh[cache_keys[index]] = (items[index][0], feedbacks[index])
+            except Exception as e:
+                app.logger.error(f"Error in AI grading: {e}")
+                metrics.inc('grading_fallbacks_total', reason=grading_error_reason(e))
+                if not placeholders:
+                    continue  # left ungraded, the background job retries it
+                feedbacks[index] = grading_error_feedback(e)
+            if on_graded:
+                on_graded(index, feedbacks[index])
+    except FutureTimeoutError:
+        app.logger.error("AI grading timed out")
+        # Calls still waiting for quota are dropped; running ones finish unused
+        for future in futures:
+            future.cancel()
+
+    for index, feedback in enumerate(feedbacks):
+        if feedback is None and placeholders:
+            metrics.inc('grading_fallbacks_total', reason='timeout')
+            feedbacks[index] = GRADING_TIMEOUT_FEEDBACK
+            if on_graded:
+                on_graded(index, feedbacks[index])
+
+    if fresh and app.config['GRADE_CACHE_ENABLED']:
+        store_grade_cache(fresh)
+    return feedbacks
+
+
+# ============================================================================
+# GRADING CACHE
+# ============================================================================
+
+grade_cache_stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+_grade_cache_stats_lock = threading.Lock()
+
+
+def _count_grade_cache(name, amount=1):
+    with _grade_cache_stats_lock:
+        grade_cache_stats[name] += amount
+
+
+def image_digest(image_path):
+    """Hash the content of an uploaded image, or '' when there is none"""
+    if not image_path:
+        return ''
+    if is_content_addressed(image_path):
+        return os.path.splitext(image_path)[0]
+    full_path = os.path.join(app.config['UPLOAD_FOLDER'], image_path)
+    if not os.path.exists(full_path):
+        return ''
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def grade_cache_key(question_id, question_text, student_answer, image_path=None):
+    """
+    Content address of a graded answer: question id and text, grading model and prompt
+    version, normalized answer and image hash. Editing a question or switching the model
+    or prompt therefore misses the old entries instead of serving their grades
+    """
+    material = '\0'.join([
+        str(question_id), question_text, gemini_clients.model_name, str(GRADING_PROMPT_VERSION),
+        clean_for_ai(student_answer), image_digest(image_path)
+    ])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def lookup_grade_cache(keys):
+    """
+    Return {key: feedback} for the cached, unexpired entries among keys
+    Hits are marked as recently used for LRU eviction
+    """
+    keys = list(set(keys))
+    fresh_after = datetime.utcnow() - timedelta(seconds=app.config['GRADE_CACHE_TTL'])
+    entries = GradeCache.query.filter(
+        GradeCache.key.in_(keys),
+        GradeCache.created_at >= fresh_after
+    ).all()
+    
+    now = datetime.utcnow()
+    for entry in entries:
+        entry.hits += 1
+        entry.last_used_at = now
+    
+    _count_grade_cache('hits', len(entries))
+    _count_grade_cache('misses', len(keys) - len(entries))
+    return {entry.key: entry.feedback for entry in entries}
+
+
+def store_grade_cache(entries):
+    """
+    Upsert {key: (question_id, feedback)} into the grading cache
+    Uses the dialect's ON CONFLICT so concurrent submissions of the same answer don't collide
+    """
+    now = datetime.utcnow()
+    rows = [{
+        'key': key,
+        'question_id': question_id,
+        'feedback': feedback,
+        'hits': 0,
+        'created_at': now,
+        'last_used_at': now
+    } for key, (question_id, feedback) in entries.items()]
+    
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(GradeCache).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['key'],
+            set_={'feedback': stmt.excluded.feedback, 'created_at': now, 'last_used_at': now}
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            db.session.merge(GradeCache(**row))
+    
+    _count_grade_cache('stores', len(rows))
+    if grade_cache_stats['stores'] % 100 < len(rows):
+        prune_grade_cache()
+
+
+def prune_grade_cache():
+    """Drop expired entries, then the least recently used ones above the size limit"""
+    expired_before = datetime.utcnow() - timedelta(seconds=app.config['GRADE_CACHE_TTL'])
+    removed = GradeCache.query.filter(GradeCache.created_at < expired_before).delete(synchronize_session=False)
+    
+    if GradeCache.query.count() > app.config['GRADE_CACHE_MAX_ENTRIES']:
+        keep = db.session.query(GradeCache.key).order_by(
+            GradeCache.last_used_at.desc()
+        ).limit(app.config['GRADE_CACHE_MAX_ENTRIES'])
+        removed += GradeCache.query.filter(GradeCache.key.notin_(keep.scalar_subquery())).delete(synchronize_session=False)
+    
+    _count_grade_cache('evictions', removed)
 
 
 def calculate_max_points(difficulty):
@@ -228,11 +930,703 @@ def calculate_max_points(difficulty):
     return points_map.get(difficulty, 10)
 
 
+def calculate_points(ai_feedback, max_points):
+    """Scale the 0-10 score in AI feedback to the question's max points"""
+    try:
+        for line in ai_feedback.split('\n'):
+            if line.startswith('Xal:'):
+                score = int(line.split(':')[1].strip())
+                return int((score / 10) * max_points)
+    except (ValueError, IndexError, AttributeError) as e:
+        app.logger.error(f"Error parsing points: {e}")
+    return 0
+
+
+def answer_to_row(answer):
+    """Build the result.html row for a stored Answer"""
+    return {
+        'id': answer.id,
+        'status': answer.status,
+        'question': answer.question.html,
+        'student_answer': answer.answer_text,
+        'feedback': answer.feedback,
+        'image': answer.image_path,
+        'points': answer.points,
+        'max_points': answer.max_points,
+        'difficulty': answer.question.difficulty
+    }
+
+
+# ============================================================================
+# COMMIT HOOKS
+# ============================================================================
+
+# Aggregates derived from committed Results; other worker processes expire them by TTL
+summary_cache = TTLCache(ttl=app.config['DASHBOARD_SUMMARY_TTL'], max_size=16)
+
+
+@event.listens_for(Session, 'after_flush')
+def track_changes(session, flush_context):
+    """Remember which cached tables this transaction wrote"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Result):
+            session.info['results_changed'] = True
+            session.info.setdefault('result_users', set()).add(obj.username)
+            if obj.id is not None:
+                session.info.setdefault('graded_results', set()).add(obj.id)
+        elif isinstance(obj, Answer) and obj.result_id is not None:
+            session.info.setdefault('graded_results', set()).add(obj.result_id)
+        elif isinstance(obj, Question):
+            session.info['questions_changed'] = True
+        elif isinstance(obj, Subject):
+            session.info['subjects_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def invalidate_after_commit(session):
+    """Drop cached data once a transaction that changed it has committed"""
+    if session.info.pop('results_changed', False):
+        results_committed(session.info.pop('result_users', None))
+    if 'graded_results' in session.info:
+        notify_result_listeners(session.info.pop('graded_results'))
+    if session.info.pop('questions_changed', False):
+        invalidate_question_index()
+    if session.info.pop('subjects_changed', False):
+        invalidate_pages('index')
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_changes_after_rollback(session):
+    for name in ('results_changed', 'result_users', 'graded_results', 'questions_changed', 'subjects_changed'):
+        session.info.pop(name, None)
+
+
+def results_committed(usernames=None):
+    """Invalidate everything derived from the Result table; usernames limits the history pages dropped"""
+    summary_cache.clear()
+    invalidate_pages('dashboard')
+    invalidate_pages('history', usernames)
+
+
+_result_listeners = {}  # result id -> Events of the open event streams for it
+_result_listeners_lock = threading.Lock()
+
+
+def listen_for_result(result_id):
+    """Event set whenever answers of the result are committed in this process"""
+    event = threading.Event()
+    with _result_listeners_lock:
+        _result_listeners.setdefault(result_id, set()).add(event)
+    return event
+
+
+def stop_listening(result_id, event):
+    with _result_listeners_lock:
+        listeners = _result_listeners.get(result_id)
+        if listeners is not None:
+            listeners.discard(event)
+            if not listeners:
+                del _result_listeners[result_id]
+
+
+def notify_result_listeners(result_ids):
+    with _result_listeners_lock:
+        for result_id in result_ids:
+            for event in _result_listeners.get(result_id, ()):
+                event.set()
+
+
+# ============================================================================
+# PAGE CACHE
+# ============================================================================
+
+page_cache = TTLCache(ttl=app.config['PAGE_CACHE_TTL'], max_size=app.config['PAGE_CACHE_MAX_ENTRIES'])
+_page_cache_generation = 0  # bumped on every invalidation so renders that raced one are not stored
+_page_cache_lock = threading.Lock()  # invalidations come from after_commit on any thread, grading workers included
+
+
+def invalidate_pages(endpoint, usernames=None):
+    """Drop cached pages of an endpoint, for all users or only the given ones"""
+    global _page_cache_generation
+    with _page_cache_lock:
+        _page_cache_generation += 1
+        page_cache.discard_where(
+            lambda key: key[0] == endpoint and (usernames is None or key[1] in usernames)
+        )
+
+
+def cached_page(per_user=True):
+    """
+    Serve a GET page from page_cache and answer conditional requests with 304
+    per_user: key the page by username; otherwise it is shared by all logged-in users
+    Views call skip_page_cache() for pages that must not be stored, e.g. with pending results
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session:
+                # The page would consume the pending messages
+                return view(*args, **kwargs)
+            
+            username = session.get('username')
+            key = (request.endpoint, username if per_user else username is not None,
+                   'api_key' in session, session.get('last_result_id'), request.full_path)
+            entry = page_cache.get(key)
+            if entry is None:
+                generation = _page_cache_generation
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.pop('skip_page_cache', False):
+                    return response
+                body = response.get_data()
+                entry = (body, hashlib.sha256(body).hexdigest()[:32], datetime.utcnow().replace(microsecond=0))
+                with _page_cache_lock:
+                    if generation == _page_cache_generation:
+                        page_cache.set(key, entry)
+            
+            body, etag, last_modified = entry
+            response = make_response(body)
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
+
+
+def skip_page_cache():
+    """Keep the page being rendered out of page_cache"""
+    g.skip_page_cache = True
+
+
+# ============================================================================
+# SCORE STATISTICS
+# ============================================================================
+
+def increment_counters(model, keys, rows):
+    """
+    Add {key tuple: {column: delta}} to the counter columns of model in the current transaction,
+    creating missing rows. Each row is changed with col = col + delta, so concurrent writers never lose counts
+    """
+    values = [dict(zip(keys, key), **deltas) for key, deltas in rows.items() if any(deltas.values())]
+    if not values:
+        return
+    table = model.__table__
+    columns = [name for name in values[0] if name not in keys]
+    
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table).values(values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + stmt.excluded[name] for name in columns}
+        )
+        db.session.execute(stmt)
+    else:
+        for value in values:
+            updated = db.session.execute(
+                table.update().where(and_(*(table.c[key] == value[key] for key in keys))).values(
+                    {name: table.c[name] + value[name] for name in columns}
+                )
+            )
+            if updated.rowcount == 0:
+                db.session.execute(table.insert().values(value))
+
+
+def record_score_stats(answer_scores, result_scores, sign=1):
+    """
+    Count graded answers and results in the statistics tables, in the caller's transaction
+    answer_scores: (question_id, points, max_points) tuples
+    result_scores: (subject_id, total_score) tuples
+    sign=-1 takes them out again, e.g. before re-grading
+    """
+    questions, subjects, counts = {}, {}, {}
+    for question_id, points, max_points in answer_scores:
+        row = questions.setdefault((question_id,), dict.fromkeys(
+            ('answers', 'points_sum', 'points_sq_sum', 'max_points_sum'), 0
+        ))
+        row['answers'] += sign
+        row['points_sum'] += sign * points
+        row['points_sq_sum'] += sign * points * points
+        row['max_points_sum'] += sign * max_points
+        counts.setdefault(('question', question_id, points), {'count': 0})['count'] += sign
+    for subject_id, total_score in result_scores:
+        row = subjects.setdefault((subject_id,), dict.fromkeys(('results', 'score_sum', 'score_sq_sum'), 0))
+        row['results'] += sign
+        row['score_sum'] += sign * total_score
+        row['score_sq_sum'] += sign * total_score * total_score
+        counts.setdefault(('subject', subject_id, total_score), {'count': 0})['count'] += sign
+    
+    increment_counters(QuestionStat, ('question_id',), questions)
+    increment_counters(SubjectStat, ('subject_id',), subjects)
+    increment_counters(ScoreCount, ('scope', 'scope_id', 'score'), counts)
+
+
+def rebuild_score_stats():
+    """Recompute the statistics tables from all graded results in one transaction; returns row counts"""
+    graded = Result.status == 'graded'
+    answers = db.session.query(Answer).join(Result, Answer.result_id == Result.id).filter(graded)
+    
+    db.session.query(ScoreCount).delete(synchronize_session=False)
+    db.session.query(QuestionStat).delete(synchronize_session=False)
+    db.session.query(SubjectStat).delete(synchronize_session=False)
+    
+    statements = [
+        (QuestionStat, ['question_id', 'answers', 'points_sum', 'points_sq_sum', 'max_points_sum'],
+         answers.with_entities(
+             Answer.question_id, db.func.count(Answer.id), db.func.sum(Answer.points),
+             db.func.sum(Answer.points * Answer.points), db.func.sum(Answer.max_points)
+         ).group_by(Answer.question_id)),
+        (ScoreCount, ['scope', 'scope_id', 'score', 'count'],
+         answers.with_entities(
+             db.literal('question'), Answer.question_id, Answer.points, db.func.count(Answer.id)
+         ).group_by(Answer.question_id, Answer.points)),
+        (SubjectStat, ['subject_id', 'results', 'score_sum', 'score_sq_sum'],
+         db.session.query(
+             Result.subject_id, db.func.count(Result.id), db.func.sum(Result.total_score),
+             db.func.sum(Result.total_score * Result.total_score)
+         ).filter(graded).group_by(Result.subject_id)),
+        (ScoreCount, ['scope', 'scope_id', 'score', 'count'],
+         db.session.query(
+             db.literal('subject'), Result.subject_id, Result.total_score, db.func.count(Result.id)
+         ).filter(graded).group_by(Result.subject_id, Result.total_score)),
+    ]
+    for model, columns, query in statements:
+        db.session.execute(model.__table__.insert().from_select(columns, query))
+    db.session.commit()
+    
+    return {
+        'questions': QuestionStat.query.count(),
+        'subjects': SubjectStat.query.count(),
+        'histogram_rows': ScoreCount.query.count()
+    }
+
+
+def score_summary(count, total, square_total):
+    """Mean and population standard deviation from running totals"""
+    if not count:
+        return {'count': 0, 'mean': None, 'stddev': None}
+    mean = total / count
+    return {'count': count, 'mean': mean, 'stddev': max(0.0, square_total / count - mean * mean) ** 0.5}
+
+
+def score_histogram(scope, scope_id):
+    """{score: count} of one question or subject, at most one row per possible score"""
+    return {
+        score: count for score, count in db.session.query(ScoreCount.score, ScoreCount.count).filter(
+            ScoreCount.scope == scope, ScoreCount.scope_id == scope_id, ScoreCount.count > 0
+        ).order_by(ScoreCount.score)
+    }
+
+
+def get_question_stats(question_id):
+    """Points statistics of a question's graded answers, read from the statistics tables"""
+    stat = db.session.get(QuestionStat, question_id)
+    if stat is None:
+        stats = score_summary(0, 0, 0)
+        stats['mean_ratio'] = None
+    else:
+        stats = score_summary(stat.answers, stat.points_sum, stat.points_sq_sum)
+        stats['mean_ratio'] = stat.points_sum / stat.max_points_sum if stat.max_points_sum else None
+    stats['histogram'] = score_histogram('question', question_id)
+    return stats
+
+
+def get_subject_stats(subject_id):
+    """Total score statistics of a subject's graded results, read from the statistics tables"""
+    stat = db.session.get(SubjectStat, subject_id)
+    stats = score_summary(stat.results, stat.score_sum, stat.score_sq_sum) if stat else score_summary(0, 0, 0)
+    stats['histogram'] = score_histogram('subject', subject_id)
+    return stats
+
+
+def get_difficulty_calibration(subject_id):
+    """
+    Per difficulty of a subject: questions answered, answers and the mean share of max points scored
+    Cost grows with the question bank, not with the number of exams
+    """
+    rows = db.session.query(
+        Question.difficulty, db.func.count(QuestionStat.question_id), db.func.sum(QuestionStat.answers),
+        db.func.sum(QuestionStat.points_sum), db.func.sum(QuestionStat.max_points_sum)
+    ).join(QuestionStat, QuestionStat.question_id == Question.id).filter(
+        Question.subject_id == subject_id, QuestionStat.answers > 0
+    ).group_by(Question.difficulty).all()
+    return {
+        difficulty: {
+            'questions': questions,
+            'answers': int(answers or 0),
+            'mean_ratio': float(points) / float(max_points) if max_points else None
+        } for difficulty, questions, answers, points, max_points in rows
+    }
+
+
+# ============================================================================
+# DASHBOARD QUERIES
+# ============================================================================
+
+def get_dashboard_summary():
+    """
+    Overall and per-subject statistics of graded results, cached
+    Exam counts and scores come from the statistics tables; only the distinct user count scans results
+    """
+    def compute():
+        total_users = db.session.query(db.func.count(db.distinct(Result.username))).filter(
+            Result.status == 'graded'
+        ).scalar()
+        
+        subjects = db.session.query(Subject.id, Subject.name, SubjectStat.results, SubjectStat.score_sum).join(
+            SubjectStat, SubjectStat.subject_id == Subject.id
+        ).filter(SubjectStat.results > 0).order_by(Subject.name).all()
+        score_ranges = {
+            subject_id: (low, high) for subject_id, low, high in db.session.query(
+                ScoreCount.scope_id, db.func.min(ScoreCount.score), db.func.max(ScoreCount.score)
+            ).filter(ScoreCount.scope == 'subject', ScoreCount.count > 0).group_by(ScoreCount.scope_id)
+        }
+        
+        total_exams = sum(exams for _, _, exams, _ in subjects)
+        total_score = sum(score_sum for _, _, _, score_sum in subjects)
+        return {
+            'total_users': total_users,
+            'total_exams': total_exams,
+            'avg_score': float(total_score) / total_exams if total_exams else 0.0,
+            'subjects': [{
+                'name': name,
+                'exams': exams,
+                'avg_score': float(score_sum) / exams,
+                'min_score': score_ranges.get(subject_id, (None, None))[0],
+                'max_score': score_ranges.get(subject_id, (None, None))[1]
+            } for subject_id, name, exams, score_sum in subjects]
+        }
+    
+    return summary_cache.get_or_set('dashboard', compute)
+
+
+def get_results_page(before_id=None, page_size=50):
+    """
+    One page of graded results, newest first, using keyset pagination on (exam_date, id)
+    Returns (results, next_cursor) where next_cursor is None on the last page
+    """
+    query = Result.query.options(joinedload(Result.subject)).filter(Result.status == 'graded')
+    return keyset_page(query, before_id, page_size)
+
+
+def get_history_page(username, before_id=None, page_size=20):
+    """
+    One page of a user's results with summary columns only; answer bodies are loaded on expand
+    Returns (results, answer_points, next_cursor), answer_points maps result id to its answers' scores
+    """
+    query = Result.query.options(
+        load_only(Result.id, Result.subject_id, Result.total_score, Result.exam_date, Result.status),
+        joinedload(Result.subject)
+    ).filter(Result.username == username)
+    results, next_cursor = keyset_page(query, before_id, page_size)
+    
+    answer_points = {result.id: [] for result in results}
+    if results:
+        rows = db.session.query(
+            Answer.result_id, Answer.points, Answer.max_points, Answer.status
+        ).filter(Answer.result_id.in_(list(answer_points))).order_by(Answer.id)
+        for row in rows:
+            answer_points[row.result_id].append(row)
+    return results, answer_points, next_cursor
+
+
+def keyset_page(query, before_id, page_size):
+    """Apply newest-first keyset pagination on (exam_date, id) to a Result query"""
+    if before_id is not None:
+        cursor = db.session.get(Result, before_id)
+        if cursor is not None:
+            query = query.filter(or_(
+                Result.exam_date < cursor.exam_date,
+                and_(Result.exam_date == cursor.exam_date, Result.id < cursor.id)
+            ))
+    
+    results = query.order_by(Result.exam_date.desc(), Result.id.desc()).limit(page_size + 1).all()
+    next_cursor = results[page_size - 1].id if len(results) > page_size else None
+    return results[:page_size], next_cursor
+
+
+# ============================================================================
+# GRADING QUEUE
+# ============================================================================
+
+_grading_workers = []
+_grading_workers_pid = None  # a child forked by gunicorn --preload has the list but not the threads
+_grading_workers_lock = threading.Lock()
+_grading_wakeup = threading.Event()
+
+
+# Encrypts the API keys stored with queued jobs; changing SECRET_KEY makes the keys of queued jobs unreadable
+job_key_cipher = Fernet(base64.urlsafe_b64encode(HKDF(
+    algorithm=hashes.SHA256(), length=32, salt=None, info=b'grading-job-api-key'
+).derive(app.config['SECRET_KEY'].encode('utf-8'))))
+
+
+def seal_api_key(api_key):
+    """Encrypt an API key for GradingJob.api_key"""
+    return job_key_cipher.encrypt(api_key.encode('utf-8')).decode('ascii') if api_key else None
+
+
+def open_api_key(token):
+    """Decrypt GradingJob.api_key; raises InvalidToken if it was sealed under another SECRET_KEY"""
+    if not token:
+        return None
+    try:
+        return job_key_cipher.decrypt(token.encode('ascii')).decode('utf-8')
+    except InvalidToken:
+        if token.startswith('gAAAAA'):  # a Fernet token, just not ours
+            raise
+        return token  # queued in plain text before keys were encrypted
+
+
+def enqueue_grading(result, api_key):
+    """Add a grading job for a pending Result to the current session"""
+    job = GradingJob(result=result, api_key=seal_api_key(api_key))
+    db.session.add(job)
+    return job
+
+
+def claim_grading_job():
+    """
+    Atomically claim the oldest queued job, or a running job whose worker died
+    Returns the claimed GradingJob or None
+    """
+    stale_before = datetime.utcnow() - timedelta(seconds=app.config['GRADING_JOB_STALE_AFTER'])
+    candidate = GradingJob.query.filter(or_(
+        GradingJob.status == 'queued',
+        and_(GradingJob.status == 'running', GradingJob.started_at < stale_before)
+    )).order_by(GradingJob.id).first()
+    if candidate is None:
+        return None
+
+    # attempts works as a version number so only one worker wins the claim
+    claimed = GradingJob.query.filter_by(
+        id=candidate.id, status=candidate.status, attempts=candidate.attempts
+    ).update({
+        'status': 'running',
+        'started_at': datetime.utcnow(),
+        'attempts': candidate.attempts + 1
+    }, synchronize_session=False)
+    db.session.commit()
+
+    if not claimed:
+        return None
+    return db.session.get(GradingJob, candidate.id)
+
+
+class GradingIncomplete(Exception):
+    """Some answers of a job could not be graded; the job is retried for them"""
+
+
+def process_grading_job(job):
+    """
+    Grade the pending answers of a job's Result, committing each answer as it finishes
+    Answers whose calls failed stay pending and the job raises GradingIncomplete, so it is
+    requeued for just those answers instead of giving them placeholder grades
+    """
+    result = db.session.get(Result, job.result_id)
+    pending = Answer.query.options(joinedload(Answer.question)).filter_by(
+        result_id=job.result_id, status='pending'
+    ).order_by(Answer.id).all()
+
+    def save_answer(index, ai_feedback):
+        answer = pending[index]
+        answer.points = calculate_points(ai_feedback, answer.max_points)
+        answer.feedback = ai_feedback
+        answer.status = 'graded'
+        job.started_at = datetime.utcnow()  # heartbeat: a job waiting for quota is not stale
+        db.session.commit()
+
+    feedbacks = grade_answers_concurrently(
+        [(answer.question_id, question_ai_text(answer.question), answer.answer_text, answer.image_path)
+         for answer in pending],
+        open_api_key(job.api_key),
+        on_graded=save_answer,
+        student=result.username,
+        placeholders=False
+    )
+    ungraded = feedbacks.count(None)
+    if ungraded:
+        db.session.commit()  # keep the grades cached on the way
+        raise GradingIncomplete(f"{ungraded} of {len(pending)} answers could not be graded")
+
+    answer_scores = db.session.query(Answer.question_id, Answer.points, Answer.max_points).filter(
+        Answer.result_id == result.id
+    ).all()
+    result.total_score = sum(points for _, points, _ in answer_scores)
+    result.status = 'graded'
+    record_score_stats(answer_scores, [(result.subject_id, result.total_score)])
+    job.status = 'done'
+    job.api_key = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def grading_worker_loop():
+    """Background worker: claim and process grading jobs until the process exits"""
+    while True:
+        job_id = None
+        with app.app_context():
+            try:
+                job = claim_grading_job()
+                if job:
+                    job_id = job.id
+                    process_grading_job(job)
+            except Exception as e:
+                app.logger.error(f"Error in grading job {job_id}: {e}")
+                db.session.rollback()
+                if job_id:
+                    fail_grading_job(job_id, e)
+            finally:
+                db.session.remove()
+
+        if job_id is None:
+            _grading_wakeup.wait(app.config['GRADING_QUEUE_POLL_INTERVAL'])
+            _grading_wakeup.clear()
+
+
+def fail_grading_job(job_id, error):
+    """
+    Requeue a job that raised, or mark it failed after too many attempts
+    A failed job also fails its Result and the answers still pending, so the result page stops waiting
+    """
+    job = db.session.get(GradingJob, job_id)
+    if job is None:
+        return
+    job.error = str(error)
+    if job.attempts >= app.config['GRADING_JOB_MAX_ATTEMPTS']:
+        job.status = 'failed'
+        job.api_key = None
+        job.finished_at = datetime.utcnow()
+        
+        result = db.session.get(Result, job.result_id)
+        for answer in Answer.query.filter_by(result_id=job.result_id, status='pending'):
+            answer.points = 0
+            answer.feedback = GRADING_FAILED_FEEDBACK
+            answer.status = 'failed'
+        db.session.flush()
+        result.total_score = db.session.query(db.func.coalesce(db.func.sum(Answer.points), 0)).filter(
+            Answer.result_id == result.id
+        ).scalar()
+        result.status = 'failed'  # commit hooks wake the result's event streams
+    else:
+        job.status = 'queued'
+    db.session.commit()
+
+
+def start_grading_workers():
+    """Start the background grading workers once per process"""
+    global _grading_workers_pid
+    with _grading_workers_lock:
+        if _grading_workers and _grading_workers_pid == os.getpid():
+            return
+        _grading_workers.clear()
+        _grading_workers_pid = os.getpid()
+        for i in range(app.config['GRADING_QUEUE_WORKERS']):
+            worker = threading.Thread(target=grading_worker_loop, name=f'grading-queue-{i}', daemon=True)
+            worker.start()
+            _grading_workers.append(worker)
+
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.start_request()
+
+
+@app.after_request
+def record_request_timing(response):
+    elapsed = time.perf_counter() - g.pop('request_started', time.perf_counter())
+    metrics.observe('http_request_seconds', elapsed, endpoint=request.endpoint or 'none', method=request.method)
+    timings = metrics.end_request()
+    if app.config['SERVER_TIMING']:
+        timings['total'] = elapsed
+        response.headers['Server-Timing'] = server_timing_header(timings)
+    return response
+
+
+@before_render_template.connect_via(app)
+def start_render_timer(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+@template_rendered.connect_via(app)
+def record_render_timing(sender, template, context, **extra):
+    started = g.pop('render_started', None)
+    if started is not None:
+        metrics.observe('render_seconds', time.perf_counter() - started, timing='render', template=template.name)
+
+
+@event.listens_for(Session, 'before_flush')
+def start_flush_timer(session, flush_context, instances):
+    session.info['flush_started'] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def record_flush_timing(session, flush_context):
+    started = session.info.pop('flush_started', None)
+    if started is not None:
+        metrics.observe('db_seconds', time.perf_counter() - started, timing='db', op='flush')
+
+
+@event.listens_for(Session, 'before_commit')
+def start_commit_timer(session):
+    session.info['commit_started'] = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def record_commit_timing(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        metrics.observe('db_seconds', time.perf_counter() - started, timing='db', op='commit')
+
+
+@event.listens_for(Session, 'after_rollback')
+def forget_timers_after_rollback(session):
+    session.info.pop('flush_started', None)
+    session.info.pop('commit_started', None)
+
+
+def collect_cache_metrics():
+    """Hit and miss counts the caches keep themselves, read at scrape time"""
+    for name, cache in (('page', page_cache), ('dashboard_summary', summary_cache)):
+        yield 'cache_hits_total', 'counter', {'cache': name}, cache.hits
+        yield 'cache_misses_total', 'counter', {'cache': name}, cache.misses
+        yield 'cache_entries', 'gauge', {'cache': name}, len(cache)
+    yield 'cache_hits_total', 'counter', {'cache': 'grade'}, grade_cache_stats['hits']
+    yield 'cache_misses_total', 'counter', {'cache': 'grade'}, grade_cache_stats['misses']
+    yield 'grade_cache_stores_total', 'counter', {}, grade_cache_stats['stores']
+    yield 'grade_cache_evictions_total', 'counter', {}, grade_cache_stats['evictions']
+    scheduler = grading_scheduler.stats()
+    for name in ('queued', 'delayed', 'running', 'students'):
+        yield f'grading_queue_{name}', 'gauge', {}, scheduler[name]
+    yield 'grading_queue_oldest_wait_seconds', 'gauge', {}, scheduler['oldest_wait']
+    for name in ('completed', 'failed', 'cancelled'):
+        yield 'grading_calls_total', 'counter', {'outcome': name}, scheduler[name]
+    yield 'grading_retries_total', 'counter', {}, scheduler['retried']
+    yield 'grading_rate_limited_total', 'counter', {}, scheduler['rate_limited']
+    pool = gemini_clients.stats()
+    yield 'gemini_clients', 'gauge', {}, pool['size']
+    yield 'gemini_clients_created_total', 'counter', {}, pool['created']
+
+
+metrics.add_collector(collect_cache_metrics)
+
+
 # ============================================================================
 # ROUTES
 # ============================================================================
 
 @app.route('/')
+@cached_page()
 def index():
     """Main index page - shows username/API setup or subject selection"""
     if 'username' not in session:
@@ -266,17 +1660,22 @@ def set_api():
         return redirect(url_for('index'))
     
     try:
-        # Test the API key validity
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content("Hello")
+        # Test the API key validity with a model metadata lookup, cached per key
+        outcome = key_validator.validate(api_key)
+        metrics.inc('api_key_validations_total', outcome=outcome)
         
         # If we get here without exception, key is valid
         session['api_key'] = api_key
         flash('API açarı uğurla təyin edildi!', 'success')
-    except Exception as e:
-        app.logger.error(f"Invalid API key: {e}")
-        flash(f'Yanlış API açarı: {str(e)}', 'error')
+    except KeyValidationError as e:
+        metrics.inc('api_key_validations_total', outcome='backoff' if e.cached else 'rejected')
+        if not e.cached:
+            app.logger.error(f"Invalid API key: {e}")
+        flash(f'Yanlış API açarı: {str(e)} ({max(1, round(e.retry_after))} saniyə sonra yenidən yoxlanılacaq)', 'error')
+    except KeyCheckUnavailable as e:
+        metrics.inc('api_key_validations_total', outcome='unavailable')
+        app.logger.warning(f"API key check unavailable: {e}")
+        flash('API açarı hazırda yoxlanıla bilmədi: Gemini xidməti cavab vermir. Bir az sonra yenidən cəhd edin.', 'error')
     
     return redirect(url_for('index'))
 
@@ -292,106 +1691,82 @@ def exam(subject_id):
     
     if request.method == 'GET':
         try:
-            questions = get_exam_questions(subject_id)
+            seed = random.getrandbits(63)
+            questions = get_exam_questions(subject_id, seed=seed)
             if len(questions) < 5:
                 flash('Bazada kifayət qədər sual yoxdur! Zəhmət olmasa əvvəlcə sualları əlavə edin.', 'error')
                 return redirect(url_for('index'))
             
-            return render_template('exam.html', questions=questions, subject_id=subject_id, subject_name=subject.name)
+            session['exam_seed'] = seed
+            needs_mathjax = any(q.text_html is None for q in questions)
+            return render_template('exam.html', questions=questions, subject_id=subject_id, subject_name=subject.name,
+                                   needs_mathjax=needs_mathjax)
         except Exception as e:
             app.logger.error(f"Error in exam GET: {e}")
             flash(f'Xəta baş verdi: {str(e)}', 'error')
             return redirect(url_for('index'))
     
     # POST - Process exam submission
+    if app.config['GRADING_MODE'] == 'queue':
+        return submit_exam_to_queue(subject_id)
+    
     try:
         results = []
         total_score = 0
         
-        # Create result entry
+        # Read answers and store uploads before touching the database for writing
+        submitted = read_submitted_answers()
+        
+        # AI grading - all answers in parallel, results keep question order,
+        # with no write transaction held open while the model is working
+        feedbacks = grade_answers_concurrently(
+            [(question.id, question_ai_text(question), answer_text, filename)
+             for question, answer_text, filename in submitted],
+            session['api_key'],
+            student=session['username']
+        )
+        
         result = Result(
             username=session['username'],
             subject_id=subject_id,
-            total_score=0
+            question_seed=session.pop('exam_seed', None)
         )
-        db.session.add(result)
-        db.session.flush()  # Get result.id
-        
-        # Process answers
-        question_ids = request.form.getlist('question_id')
         
-        for q_id in question_ids:
-            try:
-                q_id = int(q_id)
-                answer_text = request.form.get(f'answer_{q_id}', '')
-                question = Question.query.get(q_id)
-                
-                if not question:
-                    continue
-                
-                # Handle file upload
-                filename = None
-                file = request.files.get(f'file_{q_id}')
-                if file and file.filename != '':
-                    filename = secure_filename(file.filename)
-                    if filename:
-                        # Add timestamp to avoid collisions
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                        filename = timestamp + filename
-                        file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                
-                # AI grading
-                ai_feedback = ai_grade_answer(
-                    question.text,
-                    answer_text,
-                    filename,
-                    session['api_key']
-                )
-                
-                # Calculate points
-                max_points = calculate_max_points(question.difficulty)
-                points = 0
-                
-                try:
-                    for line in ai_feedback.split('\n'):
-                        if line.startswith('Xal:'):
-                            score = int(line.split(':')[1].strip())
-                            points = int((score / 10) * max_points)
-                            break
-                except (ValueError, IndexError, AttributeError) as e:
-                    app.logger.error(f"Error parsing points: {e}")
-                    points = 0
-                
-                total_score += points
-                
-                # Save answer
-                answer = Answer(
-                    result_id=result.id,
-                    question_id=q_id,
-                    answer_text=answer_text,
-                    image_path=filename,
-                    points=points,
-                    max_points=max_points,
-                    feedback=ai_feedback
-                )
-                db.session.add(answer)
-                
-                results.append({
-                    'question': question.text,
-                    'student_answer': answer_text,
-                    'feedback': ai_feedback,
-                    'image': filename,
-                    'points': points,
-                    'max_points': max_points,
-                    'difficulty': question.difficulty
-                })
-            except Exception as e:
-                app.logger.error(f"Error processing answer for question {q_id}: {e}")
-                continue
+        for (question, answer_text, filename), ai_feedback in zip(submitted, feedbacks):
+            # Calculate points
+            max_points = calculate_max_points(question.difficulty)
+            points = calculate_points(ai_feedback, max_points)
+            total_score += points
+            
+            result.answers.append(Answer(
+                question=question,
+                answer_text=answer_text,
+                image_path=filename,
+                points=points,
+                max_points=max_points,
+                feedback=ai_feedback
+            ))
+            
+            results.append({
+                'question': question.html,
+                'student_answer': answer_text,
+                'feedback': ai_feedback,
+                'image': filename,
+                'points': points,
+                'max_points': max_points,
+                'difficulty': question.difficulty
+            })
         
-        # Update total score
+        # One short write: result, all answers and the statistics they add to
         result.total_score = total_score
+        db.session.add(result)
+        record_score_stats(
+            [(question.id, answer.points, answer.max_points)
+             for (question, _, _), answer in zip(submitted, result.answers)],
+            [(subject_id, total_score)]
+        )
         db.session.commit()
+        session['last_result_id'] = result.id
         
         return render_template('result.html', results=results, total_score=total_score)
         
@@ -402,50 +1777,386 @@ def exam(subject_id):
         return redirect(url_for('index'))
 
 
+def submit_exam_to_queue(subject_id):
+    """Store the submission as pending and leave grading to the background workers"""
+    try:
+        submitted = read_submitted_answers()
+        
+        result = Result(
+            username=session['username'],
+            subject_id=subject_id,
+            total_score=0,
+            status='pending',
+            question_seed=session.pop('exam_seed', None)
+        )
+        for question, answer_text, filename in submitted:
+            result.answers.append(Answer(
+                question=question,
+                answer_text=answer_text,
+                image_path=filename,
+                points=0,
+                max_points=calculate_max_points(question.difficulty),
+                status='pending'
+            ))
+        
+        db.session.add(result)
+        enqueue_grading(result, session['api_key'])
+        db.session.commit()
+        session['last_result_id'] = result.id
+        
+        start_grading_workers()
+        _grading_wakeup.set()
+        
+        return redirect(url_for('result_page', result_id=result.id))
+        
+    except Exception as e:
+        app.logger.error(f"Error in exam POST: {e}")
+        db.session.rollback()
+        flash(f'İmtahan zamanı xəta baş verdi: {str(e)}', 'error')
+        return redirect(url_for('index'))
+
+
+def read_submitted_answers():
+    """
+    Collect (question, answer_text, image_filename) for each submitted question
+    Uploaded images and drawings embedded in the answer are stored on the way; unknown questions are skipped
+    """
+    submitted = []
+    for number, q_id in enumerate(request.form.getlist('question_id'), start=1):
+        try:
+            q_id = int(q_id)
+            question = db.session.get(Question, q_id)
+            
+            if not question:
+                continue
+            
+            answer_text = store_inline_images(request.form.get(f'answer_{q_id}', ''))
+            
+            # Handle file upload; an oversized image is dropped on its own and the answer is kept
+            try:
+                filename = save_uploaded_image(q_id)
+            except RequestEntityTooLarge as e:
+                flash(f'Sual {number}: {e.description}, şəkil qəbul edilmədi.', 'error')
+                filename = None
+            
+            submitted.append((question, answer_text, filename))
+        except Exception as e:
+            app.logger.error(f"Error processing answer for question {q_id}: {e}")
+            continue
+    return submitted
+
+
+def store_inline_images(answer_text):
+    """Replace the data-URI drawings of an answer with references to stored image files"""
+    answer_text, filenames = extract_inline_images(
+        answer_text,
+        app.config['UPLOAD_FOLDER'],
+        max_bytes=app.config['MAX_UPLOAD_FILE_SIZE'],
+        max_images=app.config['MAX_INLINE_IMAGES'],
+        url_prefix=url_for('static', filename='uploads/')
+    )
+    if filenames:
+        metrics.inc('inline_images_total', len(filenames))
+    return answer_text
+
+
+def save_uploaded_image(q_id):
+    """Store the image uploaded for a question under its content hash, if any"""
+    file = request.files.get(f'file_{q_id}')
+    if not file or file.filename == '':
+        return None
+    return store_upload(file, app.config['UPLOAD_FOLDER'], app.config['MAX_UPLOAD_FILE_SIZE'])
+
+
+def get_own_result(result_id):
+    """Load a Result of the logged-in user or abort with 404"""
+    result = Result.query.options(
+        joinedload(Result.answers).joinedload(Answer.question)
+    ).filter_by(id=result_id, username=session.get('username')).first()
+    if result is None:
+        abort(404)
+    return result
+
+
+@app.route('/result/<int:result_id>')
+def result_page(result_id):
+    """Result page - shows graded answers and polls for the ones still pending"""
+    if 'username' not in session:
+        flash('Nəticəyə baxmaq üçün giriş edin!', 'error')
+        return redirect(url_for('index'))
+    
+    result = get_own_result(result_id)
+    results = [answer_to_row(answer) for answer in sorted(result.answers, key=lambda a: a.id)]
+    return render_template('result.html', results=results, total_score=result.total_score,
+                           result_id=result.id, pending=result.status == 'pending',
+                           failed=result.status == 'failed', events=app.config['RESULT_EVENTS_ENABLED'])
+
+
+@app.route('/result/<int:result_id>/status')
+def result_status(result_id):
+    """Grading progress of a result as JSON"""
+    if 'username' not in session:
+        abort(401)
+    
+    result = get_own_result(result_id)
+    return jsonify({
+        'status': result.status,
+        'total_score': result.total_score,
+        'answers': [{
+            'id': answer.id,
+            'status': answer.status,
+            'points': answer.points,
+            'max_points': answer.max_points,
+            'feedback': answer.feedback
+        } for answer in sorted(result.answers, key=lambda a: a.id)]
+    })
+
+
+@app.route('/result/<int:result_id>/events')
+def result_events(result_id):
+    """
+    Server-sent events for a pending result: one 'answer' event per graded or failed answer with the
+    running total, then 'done'. Grades committed in this process wake the stream at once,
+    others are picked up every RESULT_EVENTS_POLL_INTERVAL seconds. Off unless RESULT_EVENTS_ENABLED
+    """
+    if not app.config['RESULT_EVENTS_ENABLED']:
+        abort(404)
+    if 'username' not in session:
+        abort(401)
+    
+    owned = db.session.query(Result.id).filter_by(id=result_id, username=session['username']).first()
+    if owned is None:
+        abort(404)
+    db.session.rollback()  # don't hold a read transaction while the stream is open
+    
+    def format_event(name, data, event_id=None):
+        lines = [f'id: {event_id}'] if event_id is not None else []
+        lines += [f'event: {name}', f'data: {json.dumps(data, ensure_ascii=False)}']
+        return '\n'.join(lines) + '\n\n'
+    
+    def stream():
+        wakeup = listen_for_result(result_id)
+        deadline = time.monotonic() + app.config['RESULT_EVENTS_MAX_SECONDS']
+        sent = set()
+        total_score = 0
+        last_write = time.monotonic()
+        try:
+            yield 'retry: 2000\n\n'
+            while True:
+                wakeup.clear()
+                graded = db.session.query(
+                    Answer.id, Answer.points, Answer.max_points, Answer.feedback
+                ).filter(Answer.result_id == result_id, Answer.status != 'pending').order_by(Answer.id).all()
+                status = db.session.query(Result.status).filter_by(id=result_id).scalar()
+                db.session.rollback()
+                
+                for answer_id, points, max_points, feedback in graded:
+                    if answer_id in sent:
+                        continue
+                    sent.add(answer_id)
+                    total_score += points or 0
+                    last_write = time.monotonic()
+                    yield format_event('answer', {
+                        'id': answer_id,
+                        'points': points,
+                        'max_points': max_points,
+                        'feedback': feedback,
+                        'total_score': total_score
+                    }, event_id=answer_id)
+                
+                if status != 'pending':
+                    yield format_event('done', {'status': status, 'total_score': total_score})
+                    return
+                
+                now = time.monotonic()
+                if now >= deadline:
+                    return
+                if now - last_write >= app.config['RESULT_EVENTS_KEEPALIVE']:
+                    last_write = now
+                    yield ': keepalive\n\n'
+                wakeup.wait(min(app.config['RESULT_EVENTS_POLL_INTERVAL'], deadline - now))
+        finally:
+            stop_listening(result_id, wakeup)
+            db.session.remove()
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # let nginx pass events through unbuffered
+    })
+
+
 @app.route('/history')
+@cached_page()
 def history():
     """Display user's exam history"""
     if 'username' not in session:
         flash('Tarixçəyə baxmaq üçün giriş edin!', 'error')
         return redirect(url_for('index'))
     
-    results = Result.query.options(
-        joinedload(Result.subject),
-        joinedload(Result.answers).joinedload(Answer.question)
-    ).filter_by(username=session['username']).order_by(Result.exam_date.desc()).all()
+    results, answer_points, next_cursor = get_history_page(
+        session['username'],
+        before_id=request.args.get('before', type=int),
+        page_size=app.config['HISTORY_PAGE_SIZE']
+    )
+    if any(result.status == 'pending' for result in results):
+        skip_page_cache()
     
-    return render_template('history.html', results=results)
+    return render_template('history.html',
+                           results=results,
+                           answer_points=answer_points,
+                           next_cursor=next_cursor,
+                           is_first_page='before' not in request.args)
+
+
+@app.route('/history/<int:result_id>/answers')
+def history_answers(result_id):
+    """Full answers, feedback and question texts of one result as JSON, for expanding it in the history"""
+    if 'username' not in session:
+        abort(401)
+    
+    result = get_own_result(result_id)
+    answers = []
+    for answer in sorted(result.answers, key=lambda a: a.id):
+        row = answer_to_row(answer)
+        row['image'] = url_for('static', filename='uploads/' + answer.image_path) if answer.image_path else None
+        answers.append(row)
+    return jsonify({'id': result.id, 'status': result.status, 'answers': answers})
 
 
 @app.route('/dashboard')
+@cached_page(per_user=False)
 def dashboard():
     """Display dashboard with all exam statistics"""
     if 'username' not in session:
         flash('Dashboard-a baxmaq üçün giriş edin!', 'error')
         return redirect(url_for('index'))
     
-    all_results = Result.query.options(joinedload(Result.subject)).order_by(Result.exam_date.desc()).all()
-    
-    # Calculate statistics
-    total_users = len(set(r.username for r in all_results))
-    total_exams = len(all_results)
-    avg_score = sum(r.total_score for r in all_results) / total_exams if total_exams > 0 else 0
+    summary = get_dashboard_summary()
+    results, next_cursor = get_results_page(
+        before_id=request.args.get('before', type=int),
+        page_size=app.config['DASHBOARD_PAGE_SIZE']
+    )
     
     return render_template('dashboard.html', 
-                         results=all_results,
-                         total_users=total_users,
-                         total_exams=total_exams,
-                         avg_score=avg_score)
+                         results=results,
+                         next_cursor=next_cursor,
+                         is_first_page='before' not in request.args,
+                         subject_stats=summary['subjects'],
+                         total_users=summary['total_users'],
+                         total_exams=summary['total_exams'],
+                         avg_score=summary['avg_score'])
+
+
+@app.route('/stats/subjects/<int:subject_id>')
+def subject_stats(subject_id):
+    """Score distribution and difficulty calibration of a subject as JSON"""
+    if 'username' not in session:
+        abort(401)
+    
+    subject = Subject.query.get_or_404(subject_id)
+    stats = get_subject_stats(subject.id)
+    stats['subject'] = subject.name
+    stats['difficulties'] = get_difficulty_calibration(subject.id)
+    return jsonify(stats)
+
+
+@app.route('/stats/questions/<int:question_id>')
+def question_stats(question_id):
+    """Points distribution of a question's graded answers as JSON"""
+    if 'username' not in session:
+        abort(401)
+    
+    question = Question.query.get_or_404(question_id)
+    stats = get_question_stats(question.id)
+    stats['difficulty'] = question.difficulty
+    return jsonify(stats)
+
+
+@app.route('/metrics')
+def metrics_page():
+    """Counters and timing histograms of this worker process in the Prometheus text format"""
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/pool_stats')
+def pool_stats():
+    """Connection pool usage of this worker process as JSON"""
+    pool = db.engine.pool
+    stats = {
+        'backend': db.engine.dialect.name,
+        'pool': type(pool).__name__,
+        'status': pool.status()
+    }
+    for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return jsonify(stats)
 
 
 # ============================================================================
 # INITIALIZATION
 # ============================================================================
 
+def upgrade_database():
+    """
+    Add columns and indexes that were introduced after an existing database file was created
+    Only nullable columns or columns with a server default can be added this way
+    """
+    inspector = inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = (f'ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} '
+                       f'{column.type.compile(dialect=db.engine.dialect)}')
+                if column.server_default is not None:
+                    ddl += f" DEFAULT '{column.server_default.arg}'"
+                    if not column.nullable:
+                        ddl += ' NOT NULL'
+                conn.execute(text(ddl))
+                app.logger.info(f"Added column {table.name}.{column.name}")
+            
+            existing_indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    app.logger.info(f"Created index {index.name}")
+
+
+def derive_question_texts(batch_size=500):
+    """
+    Fill the derived text columns of questions stored before they existed
+    Math that cannot be rendered keeps text_html NULL and is retried on the next start
+    """
+    derived, last_id = 0, 0
+    while True:
+        rows = db.session.query(Question.id, Question.text, Question.text_html, Question.ai_text).filter(
+            or_(Question.text_html.is_(None), Question.ai_text.is_(None)), Question.id > last_id
+        ).order_by(Question.id).limit(batch_size).all()
+        if not rows:
+            return derived
+        last_id = rows[-1].id
+        updates = []
+        for row in rows:
+            update = {'id': row.id, 'text_html': row.text_html or render_math(row.text), 'ai_text': clean_for_ai(row.text)}
+            if update['text_html'] != row.text_html or update['ai_text'] != row.ai_text:
+                updates.append(update)
+        if updates:
+            db.session.bulk_update_mappings(Question, updates)
+            db.session.commit()
+            derived += len(updates)
+
+
 def init_database():
     """Initialize database with default subjects"""
     with app.app_context():
         db.create_all()
+        upgrade_database()
         
         # Add default subjects if they don't exist
         if not Subject.query.first():
@@ -457,6 +2168,16 @@ def init_database():
             db.session.add_all(subjects)
             db.session.commit()
             app.logger.info("Default subjects created")
+        
+        derive_question_texts()
+        get_question_index()
+        
+        # Statistics tables added to a database that already has graded results
+        if SubjectStat.query.first() is None and Result.query.filter_by(status='graded').first() is not None:
+            rebuild_score_stats()
+    
+    if app.config['GRADING_MODE'] == 'queue':
+        start_grading_workers()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,125 @@
+"""
+Index Benchmark
+Times the history, question selection and answer lookup queries on a synthetic
+database before and after the model indexes are created
+
+Usage: python benchmarks/bench_indexes.py [--results 100000] [--repeat 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app import db  # noqa: E402
+
+QUERIES = {
+    'history': (
+        "SELECT * FROM result WHERE username = :username ORDER BY exam_date DESC",
+        lambda args: {'username': f'user{random.randrange(args.users)}'}
+    ),
+    'question selection': (
+        "SELECT id FROM question WHERE subject_id = :subject_id AND difficulty = :difficulty",
+        lambda args: {'subject_id': random.randint(1, 3), 'difficulty': random.choice(['Easy', 'Medium', 'Hard'])}
+    ),
+    'answers by result': (
+        "SELECT * FROM answer WHERE result_id = :result_id",
+        lambda args: {'result_id': random.randint(1, args.results)}
+    ),
+    'answers by question': (
+        "SELECT count(*) FROM answer WHERE question_id = :question_id",
+        lambda args: {'question_id': random.randint(1, args.questions)}
+    ),
+}
+
+
+def populate(engine, args):
+    """Fill the database with subjects, questions, results and five answers per result"""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO subject (id, name) VALUES (1, 'A'), (2, 'B'), (3, 'C')"))
+        conn.execute(text(
+            "INSERT INTO question (id, text, difficulty, subject_id) VALUES (:id, :text, :difficulty, :subject_id)"
+        ), [{
+            'id': i,
+            'text': f'Question {i}',
+            'difficulty': rng.choice(['Easy', 'Medium', 'Hard']),
+            'subject_id': rng.randint(1, 3)
+        } for i in range(1, args.questions + 1)])
+        conn.execute(text(
+            "INSERT INTO result (id, username, subject_id, total_score, exam_date, status) "
+            "VALUES (:id, :username, :subject_id, :total_score, :exam_date, 'graded')"
+        ), [{
+            'id': i,
+            'username': f'user{rng.randrange(args.users)}',
+            'subject_id': rng.randint(1, 3),
+            'total_score': rng.randint(0, 50),
+            'exam_date': start + timedelta(minutes=i)
+        } for i in range(1, args.results + 1)])
+        conn.execute(text(
+            "INSERT INTO answer (result_id, question_id, answer_text, points, max_points, feedback, status) "
+            "VALUES (:result_id, :question_id, 'answer', :points, 10, 'feedback', 'graded')"
+        ), [{
+            'result_id': i // 5 + 1,
+            'question_id': rng.randint(1, args.questions),
+            'points': rng.randint(0, 10)
+        } for i in range(args.results * 5)])
+
+
+def time_queries(engine, args):
+    """Average milliseconds per query, plus the SQLite query plan"""
+    timings = {}
+    with engine.connect() as conn:
+        for name, (sql, make_params) in QUERIES.items():
+            random.seed(1)
+            plan = conn.execute(text('EXPLAIN QUERY PLAN ' + sql), make_params(args)).fetchall()
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                conn.execute(text(sql), make_params(args)).fetchall()
+            timings[name] = ((time.perf_counter() - start) * 1000 / args.repeat, plan[-1][-1])
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--results', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--questions', type=int, default=1500)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.drop(bind=conn)
+
+        print(f"Populating {args.results} results / {args.results * 5} answers...")
+        populate(engine, args)
+
+        before = time_queries(engine, args)
+        with engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn)
+            conn.execute(text('ANALYZE'))
+        after = time_queries(engine, args)
+
+    print(f"\n{'query':<22}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in QUERIES:
+        (b, b_plan), (a, a_plan) = before[name], after[name]
+        print(f"{name:<22}{b:>12.3f}{a:>12.3f}{b / a:>9.1f}x")
+        print(f"    before: {b_plan}\n    after:  {a_plan}")
+
+
+if __name__ == '__main__':
+    main()
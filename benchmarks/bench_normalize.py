@@ -0,0 +1,86 @@
+"""
+Text Normalization Benchmark
+Times the old four-regex clean_for_ai against the single-pass text_normalize version on
+the seed question bank and on synthetic long answers, and checks that both agree
+
+Usage: python benchmarks/bench_normalize.py [--answer-kb 8] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from seed_db import seed_questions  # noqa: E402
+from text_normalize import normalize_for_ai  # noqa: E402
+
+
+def legacy_clean_for_ai(text):
+    """clean_for_ai as it was before text_normalize.py"""
+    if not text:
+        return ""
+    text = re.sub(r'\\\((.*?)\\\)', r'$\1$', text)
+    text = re.sub(r'\\\[(.*?)\\\]', r'$\1$', text)
+    text = re.sub(r'\\', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def quill_answer(size, rng):
+    """Quill/MathLive style answer: paragraphs of prose with inline and display math"""
+    fragments = [
+        '<p>Let ', r'\(f(x) = \frac{x^2 + 1}{x - 1}\)', ' then ', r'\[\lim_{x \to \infty} f(x) = \infty\]',
+        '</p><p>', ' $\\sqrt{x}$ ', 'so the derivative is ', r'\(\frac{d}{dx}\left(x^{2}\right)\)', '&nbsp; ',
+        '<strong>therefore</strong> ', '\n', r'\( \alpha \le \beta \)', ' and we are done. '
+    ]
+    parts, length = [], 0
+    while length < size:
+        fragment = rng.choice(fragments)
+        parts.append(fragment)
+        length += len(fragment)
+    return ''.join(parts)
+
+
+def unbalanced_answer(size):
+    """Pasted text full of opening delimiters that never close: worst case for the non-greedy regexes"""
+    return (r'\( x + ' * (size // 7 + 1))[:size]
+
+
+def bench(func, texts, repeat):
+    """Microseconds per text"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--answer-kb', type=int, default=8, help='size of the synthetic answers')
+    parser.add_argument('--answers', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    size = args.answer_kb * 1024
+    workloads = {
+        'seed questions': [record['text'] for record in seed_questions()],
+        f'{args.answer_kb}KB answers': [quill_answer(size, rng) for _ in range(args.answers)],
+        f'{args.answer_kb}KB unbalanced': [unbalanced_answer(size)],
+    }
+
+    print(f"{'workload':<22}{'texts':>7}{'old us':>12}{'new us':>12}{'speedup':>10}{'same':>7}")
+    for name, texts in workloads.items():
+        repeat = 1 if 'unbalanced' in name else args.repeat
+        old = bench(legacy_clean_for_ai, texts, repeat)
+        new = bench(lambda text: normalize_for_ai(text, max_chars=None), texts, repeat)
+        same = all(legacy_clean_for_ai(text) == normalize_for_ai(text, max_chars=None) for text in texts)
+        print(f"{name:<22}{len(texts):>7}{old:>12.1f}{new:>12.1f}{old / new:>9.1f}x{str(same):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Submission Concurrency Benchmark
+Runs N parallel clients that each start and submit exams against a scratch SQLite
+database, once per journal mode, and reports submits per second and failures.
+AI grading is replaced by a fixed-latency stand-in so only the app and database are measured.
+
+Usage: python benchmarks/bench_submit_concurrency.py [--clients 20] [--exams 5] [--latency 0.5] [--rate-limit 0]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_clients(args):
+    """Child process: drive the app with the current environment's storage settings"""
+    sys.path.insert(0, ROOT)
+    import app as exam_app
+    from seed_db import seed_database
+
+    def fake_grade(question_text, student_answer, image_path, api_key):
+        time.sleep(args.latency)
+        return "Xal: 7\nRəy: Benchmark"
+
+    exam_app.request_ai_grade = fake_grade
+    seed_database()
+    exam_app.init_database()
+
+    with exam_app.app.app_context():
+        subject_id = exam_app.Subject.query.first().id
+
+    durations, failures = [], []
+    lock = threading.Lock()
+
+    def client(n):
+        c = exam_app.app.test_client()
+        with c.session_transaction() as s:
+            s['username'] = f'bench{n}'
+            s['api_key'] = f'bench-key-{n}'
+        for _ in range(args.exams):
+            page = c.get(f'/exam/{subject_id}').get_data(as_text=True)
+            ids = re.findall(r'name="question_id" value="(\d+)"', page)
+            form = {'question_id': ids}
+            for q_id in ids:
+                form[f'answer_{q_id}'] = f'<p>answer {n} {q_id} {time.time()}</p>'
+            start = time.perf_counter()
+            response = c.post(f'/exam/{subject_id}', data=form)
+            elapsed = time.perf_counter() - start
+            ok = response.status_code == 200 or '/result/' in (response.location or '')
+            with lock:
+                (durations if ok else failures).append(elapsed)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(args.clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    durations.sort()
+    print(json.dumps({
+        'submits': len(durations),
+        'failures': len(failures),
+        'wall': wall,
+        'per_second': len(durations) / wall,
+        'p50': durations[len(durations) // 2] if durations else 0,
+        'p95': durations[int(len(durations) * 0.95)] if durations else 0,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--exams', type=int, default=5, help='submissions per client')
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per fake grading call')
+    parser.add_argument('--grading-mode', default='sync', choices=['sync', 'queue'])
+    parser.add_argument('--modes', default='DELETE,WAL', help='journal modes to compare')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='grading calls per minute per key, 0 for none so the database is what gets measured')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_clients(args)
+        return
+
+    print(f"{args.clients} clients x {args.exams} exams, grading latency {args.latency}s, mode {args.grading_mode}, "
+          f"rate limit {args.rate_limit or 'off'}\n")
+    print(f"{'journal':<10}{'submits/s':>11}{'ok':>6}{'failed':>8}{'p50 s':>9}{'p95 s':>9}")
+    for mode in args.modes.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                SQLITE_JOURNAL_MODE=mode,
+                GRADING_MODE=args.grading_mode,
+                GRADE_CACHE_ENABLED='0',
+                GRADING_RATE_PER_MINUTE=str(args.rate_limit),
+                PYTHONWARNINGS='ignore',
+            )
+            child = [sys.executable, os.path.abspath(__file__), '--child',
+                     '--clients', str(args.clients), '--exams', str(args.exams), '--latency', str(args.latency)]
+            output = subprocess.run(child, env=env, cwd=tmp, capture_output=True, text=True, check=True).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<10}{stats['per_second']:>11.1f}{stats['submits']:>6}{stats['failures']:>8}"
+              f"{stats['p50']:>9.3f}{stats['p95']:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+Offline Load Test
+Starts the app in a child process against a scratch database, with Gemini replaced by a
+local stand-in of configurable latency, error rate and reply formats, and drives the
+full student flow over HTTP at a fixed concurrency:
+
+    set_username -> set_api -> GET /exam/<id> -> POST /exam/<id> (with images) -> /history -> /dashboard
+
+Reports throughput, p50/p95/p99 latency per step and the server's peak RSS, and stores
+the run as JSON (with the git commit) so runs of different versions can be compared.
+
+Usage: python benchmarks/loadtest.py [--users 20] [--iterations 3] [--latency 0.5]
+           [--error-rate 0.05] [--rate-limit 0] [--formats standard=0.9,no_score=0.1]
+           [--results 10000]
+           [--compare benchmarks/results/<earlier run>.json]
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+STEPS = ('set_username', 'set_api', 'exam_get', 'exam_post', 'history', 'dashboard')
+
+
+# ============================================================================
+# GEMINI STAND-IN (server process)
+# ============================================================================
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeServiceError(RuntimeError):
+    """Simulated 503, classified as transient like the real API error"""
+    code = 503
+
+
+class FakeGenerativeModel:
+    """Drop-in for genai.GenerativeModel that answers locally after a simulated delay"""
+
+    latency = 0.5
+    jitter = 0.2
+    error_rate = 0.0
+    formats = {'standard': 1.0}
+
+    def __init__(self, model_name, *args, **kwargs):
+        self.model_name = model_name
+        self._client = None
+
+    def generate_content(self, contents, *args, **kwargs):
+        time.sleep(max(0.0, random.gauss(self.latency, self.latency * self.jitter)))
+        if random.random() < self.error_rate:
+            raise FakeServiceError('503 The model is overloaded (simulated)')
+
+        prompt = contents if isinstance(contents, str) else ' '.join(p for p in contents if isinstance(p, str))
+        if 'JSON array' in prompt:
+            return FakeResponse(self.batch_reply(prompt))
+
+        kind = random.choices(list(self.formats), weights=list(self.formats.values()))[0]
+        score = random.randint(0, 10)
+        if kind == 'no_score':
+            return FakeResponse('The answer is partially correct but the reasoning is incomplete.')
+        if kind == 'markdown':
+            return FakeResponse(f'**Score: {score}/10**\n\n**Feedback:** Reasonable attempt, check the limits.')
+        return FakeResponse(f'Score: {score}/10\nFeedback: Reasonable attempt, check the limits.')
+
+    def batch_reply(self, prompt):
+        ids = re.findall(r'question_id: (\d+)', prompt)
+        return json.dumps([
+            {'question_id': int(q_id), 'score': random.randint(0, 10), 'feedback': 'Batch feedback'}
+            for q_id in ids
+        ])
+
+
+class FakeModelServiceClient:
+    """Drop-in for glm.ModelServiceClient, used by the API key check"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def get_model(self, name=None, **kwargs):
+        time.sleep(FakeGenerativeModel.latency / 10)
+        if random.random() < FakeGenerativeModel.error_rate:
+            raise FakeServiceError('503 The service is unavailable (simulated)')
+        return {'name': name}
+
+
+def parse_formats(text):
+    formats = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        formats[name.strip()] = float(weight or 1)
+    return formats
+
+
+def populate_results(app_module, count, users):
+    """Add synthetic graded results (five answers each) so history and dashboard have real volume"""
+    exam_app = app_module
+    with exam_app.app.app_context():
+        questions = [(q.id, q.subject_id) for q in exam_app.Question.query.all()]
+        rng = random.Random(7)
+        start = datetime(2025, 1, 1)
+        batch = 1000
+        for offset in range(0, count, batch):
+            results = []
+            for i in range(offset, min(count, offset + batch)):
+                subject_id = rng.choice(questions)[1]
+                results.append({
+                    'username': f'seed{rng.randrange(users)}',
+                    'subject_id': subject_id,
+                    'total_score': rng.randint(0, 50),
+                    'exam_date': start + timedelta(minutes=i),
+                    'status': 'graded',
+                })
+            exam_app.db.session.bulk_insert_mappings(exam_app.Result, results, return_defaults=True)
+            answers = [{
+                'result_id': result['id'],
+                'question_id': rng.choice(questions)[0],
+                'answer_text': '<p>Synthetic answer \\(x^2\\) with some text</p>',
+                'points': rng.randint(0, 10),
+                'max_points': 10,
+                'feedback': 'Xal: 7\nRəy: Synthetic feedback',
+                'status': 'graded',
+            } for result in results for _ in range(5)]
+            exam_app.db.session.bulk_insert_mappings(exam_app.Answer, answers)
+            exam_app.db.session.commit()
+        # Bulk inserts bypass the commit hooks, so build the statistics tables from scratch
+        exam_app.rebuild_score_stats()
+
+
+def serve(args):
+    """Child process: patch Gemini, seed the database and serve the app until killed"""
+    sys.path.insert(0, ROOT)
+    import google.ai.generativelanguage as glm
+    import google.generativeai as genai
+
+    FakeGenerativeModel.latency = args.latency
+    FakeGenerativeModel.error_rate = args.error_rate
+    FakeGenerativeModel.formats = parse_formats(args.formats)
+    genai.GenerativeModel = FakeGenerativeModel
+    glm.GenerativeServiceClient = lambda *a, **kw: None
+    glm.ModelServiceClient = FakeModelServiceClient
+
+    import logging
+    import app as exam_app
+    from seed_db import seed_database
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    seed_database()
+    exam_app.init_database()
+    populate_results(exam_app, args.results, args.seed_users)
+
+    server = make_server('127.0.0.1', 0, exam_app.app, threaded=True)
+    print(f'READY {server.server_port}', flush=True)
+    server.serve_forever()
+
+
+# ============================================================================
+# LOAD GENERATOR (parent process)
+# ============================================================================
+
+def make_png(size_kb, seed):
+    """A noisy PNG of roughly size_kb kilobytes, so uploads are not trivially compressible"""
+    from PIL import Image
+
+    side = max(16, int((size_kb * 1024 / 3) ** 0.5))
+    rng = random.Random(seed)
+    image = Image.frombytes('RGB', (side, side), bytes(rng.getrandbits(8) for _ in range(side * side * 3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def multipart_body(fields, files):
+    """Encode form fields [(name, value)] and files [(name, filename, bytes)] as multipart/form-data"""
+    boundary = uuid.uuid4().hex
+    lines = []
+    for name, value in fields:
+        lines.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        lines.append((f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                      f'Content-Type: image/png\r\n\r\n').encode() + data + b'\r\n')
+    lines.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(lines), f'multipart/form-data; boundary={boundary}'
+
+
+class VirtualStudent:
+    """One browser session walking through the student flow"""
+
+    def __init__(self, base_url, number, args, images, record):
+        self.base_url = base_url
+        self.number = number
+        self.args = args
+        self.images = images
+        self.record = record
+        self.rng = random.Random(number)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, step, path, data=None, content_type=None):
+        headers = {'Content-Type': content_type} if content_type else {}
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as response:
+                body = response.read().decode('utf-8', 'replace')
+                ok = response.status == 200
+        except (urllib.error.URLError, OSError) as e:
+            body, ok = str(e), False
+        self.record(step, time.perf_counter() - start, ok)
+        return body
+
+    def form(self, step, path, fields):
+        return self.request(step, path, urllib.parse.urlencode(fields).encode(),
+                            'application/x-www-form-urlencoded')
+
+    def login(self):
+        """Set username and API key; the key check goes through the stand-in too, so retry it like a student would"""
+        self.form('set_username', '/set_username', {'username': f'load{self.number}'})
+        for _ in range(5):
+            page = self.form('set_api', '/set_api', {'api_key': f'load-key-{self.number}'})
+            if '/exam/' in page:
+                return page
+        return page
+
+    def run(self, subject_ids):
+        self.login()
+        for _ in range(self.args.iterations):
+            subject_id = self.rng.choice(subject_ids)
+            page = self.request('exam_get', f'/exam/{subject_id}')
+            ids = re.findall(r'name="question_id" value="(\d+)"', page)
+            fields, files = [], []
+            for q_id in ids:
+                fields.append(('question_id', q_id))
+                fields.append((f'answer_{q_id}', f'<p>Answer {self.number} to {q_id}: \\(x^2 + {self.rng.random()}\\)</p>'))
+                if self.images and self.rng.random() < self.args.image_rate:
+                    files.append((f'file_{q_id}', 'answer.png', self.rng.choice(self.images)))
+            body, content_type = multipart_body(fields, files)
+            self.request('exam_post', f'/exam/{subject_id}', body, content_type)
+            self.request('history', '/history')
+            self.request('dashboard', '/dashboard')
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def peak_rss_mb(pid):
+    """Peak resident set size of a process in MB (Linux), None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(
+            os.environ,
+            DATABASE_URL=args.database_url or f"sqlite:///{os.path.join(tmp, 'load.db')}",
+            GRADING_MODE=args.grading_mode,
+            GRADING_RATE_PER_MINUTE=str(args.rate_limit),
+            PYTHONWARNINGS='ignore',
+        )
+        child = [sys.executable, os.path.abspath(__file__), '--serve',
+                 '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+                 '--formats', args.formats, '--results', str(args.results), '--seed-users', str(args.seed_users)]
+        server = subprocess.Popen(child, env=env, cwd=tmp, stdout=subprocess.PIPE, text=True)
+        try:
+            for line in server.stdout:
+                if line.startswith('READY'):
+                    base_url = f'http://127.0.0.1:{line.split()[1]}'
+                    break
+            else:
+                raise SystemExit('Server process exited before it was ready')
+            return drive(base_url, args, server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def drive(base_url, args, server_pid):
+    # Subject ids come from the index page of a logged-in session
+    probe = VirtualStudent(base_url, -1, args, [], lambda *a: None)
+    subject_ids = sorted(set(re.findall(r'/exam/(\d+)', probe.login())))
+    if not subject_ids:
+        raise SystemExit('No subjects found on the index page')
+
+    images = [make_png(args.image_kb, seed) for seed in range(4)] if args.image_rate > 0 else []
+    samples = {step: [] for step in STEPS}
+    errors = {step: 0 for step in STEPS}
+    lock = threading.Lock()
+
+    def record(step, elapsed, ok):
+        with lock:
+            samples[step].append(elapsed)
+            if not ok:
+                errors[step] += 1
+
+    students = [VirtualStudent(base_url, n, args, images, record) for n in range(args.users)]
+    threads = [threading.Thread(target=student.run, args=(subject_ids,)) for student in students]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    steps = {}
+    for step in STEPS:
+        values = sorted(samples[step])
+        steps[step] = {
+            'requests': len(values),
+            'errors': errors[step],
+            'p50': percentile(values, 0.50),
+            'p95': percentile(values, 0.95),
+            'p99': percentile(values, 0.99),
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        'commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'params': {name: value for name, value in vars(args).items() if name not in ('serve', 'compare', 'output', 'database_url')},
+        'wall_seconds': wall,
+        'requests': total,
+        'throughput': total / wall,
+        'exams_per_second': len(samples['exam_post']) / wall,
+        'peak_rss_mb': peak_rss_mb(server_pid),
+        'steps': steps,
+    }
+
+
+def print_report(report, baseline=None):
+    rss = report['peak_rss_mb']
+    print(f"commit {report['commit']}  {report['requests']} requests in {report['wall_seconds']:.1f}s  "
+          f"{report['throughput']:.1f} req/s  {report['exams_per_second']:.2f} exams/s  "
+          f"peak RSS {f'{rss:.0f} MB' if rss else 'n/a'}\n")
+    print(f"{'step':<14}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, stats in report['steps'].items():
+        print(f"{step:<14}{stats['requests']:>10}{stats['errors']:>8}"
+              f"{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+
+    if baseline:
+        print(f"\nChange against {baseline['commit']} ({baseline['started_at']}):")
+        print(f"  throughput {report['throughput'] / baseline['throughput'] - 1:+.1%}")
+        for step, stats in report['steps'].items():
+            before = baseline['steps'].get(step)
+            if before and before['p95']:
+                print(f"  {step:<14} p95 {stats['p95'] / before['p95'] - 1:+.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20, help='concurrent virtual students')
+    parser.add_argument('--iterations', type=int, default=3, help='exams per student')
+    parser.add_argument('--latency', type=float, default=0.5, help='mean seconds per fake model call')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of model calls that fail')
+    parser.add_argument('--formats', default='standard=1', help='reply formats: standard, markdown, no_score')
+    parser.add_argument('--results', type=int, default=10000, help='synthetic results seeded before the run')
+    parser.add_argument('--seed-users', type=int, default=500, help='users the synthetic results belong to')
+    parser.add_argument('--image-rate', type=float, default=0.2, help='fraction of answers with an image')
+    parser.add_argument('--image-kb', type=int, default=200)
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='grading calls per minute per API key, 0 for no limit (the stand-in has no quota)')
+    parser.add_argument('--grading-mode', default='sync', choices=['sync', 'queue'])
+    parser.add_argument('--database-url', help='run against this database instead of a scratch SQLite file')
+    parser.add_argument('--timeout', type=float, default=120, help='client timeout per request in seconds')
+    parser.add_argument('--output', help='where to store the JSON report (default: benchmarks/results/)')
+    parser.add_argument('--compare', help='earlier JSON report to compare against')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    report = run_load(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"loadtest-{datetime.now():%Y%m%d-%H%M%S}-{report['commit'] or 'nogit'}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Gemini client pool
+Keeps one configured GenerativeModel per API key instead of calling
+genai.configure() (process-wide state) and building a model on every request,
+and caches the outcome of API key checks
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import google.ai.generativelanguage as glm
+import google.generativeai as genai
+
+
+def key_fingerprint(api_key):
+    """Stable, non-reversible identifier for an API key"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+
+
+class _TimeoutClient:
+    """
+    GenerativeServiceClient wrapper that gives every call a timeout
+    GenerativeModel.generate_content only takes request_options on newer SDK releases;
+    older ones pass unknown keyword arguments into the request and reject them
+    """
+
+    def __init__(self, client, timeout):
+        self._client = client
+        self._timeout = timeout
+
+    def generate_content(self, request, **kwargs):
+        kwargs.setdefault('timeout', self._timeout)
+        return self._client.generate_content(request, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class GeminiClientPool:
+    """
+    Thread-safe pool of GenerativeModel objects bound to their own API key
+    Least recently used clients are dropped above max_size, idle ones after idle_ttl seconds
+    timeout: seconds per generate_content call, None for the client default
+    """
+
+    def __init__(self, model_name, max_size=256, idle_ttl=1800, timeout=None):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.timeout = timeout
+        self._models = OrderedDict()  # fingerprint -> (model, last_used)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def _build_model(self, api_key):
+        model = genai.GenerativeModel(self.model_name)
+        # Bind the model to its own client so no global configure() is needed
+        client = glm.GenerativeServiceClient(client_options={'api_key': api_key})
+        model._client = _TimeoutClient(client, self.timeout) if self.timeout else client
+        return model
+
+    def _evict(self, now):
+        """Drop idle clients, then the least recently used ones above max_size (lock held)"""
+        while self._models:
+            fingerprint, (model, last_used) = next(iter(self._models.items()))
+            if now - last_used <= self.idle_ttl and len(self._models) <= self.max_size:
+                break
+            # In-flight calls keep their own reference, so the client is just released here
+            del self._models[fingerprint]
+            self.evicted += 1
+
+    def get_model(self, api_key):
+        """Return the pooled GenerativeModel for api_key, creating it on first use"""
+        fingerprint = key_fingerprint(api_key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._models.pop(fingerprint, None)
+            if entry is not None and now - entry[1] <= self.idle_ttl:
+                model = entry[0]
+            else:
+                model = self._build_model(api_key)
+                self.created += 1
+            self._models[fingerprint] = (model, now)
+            self._evict(now)
+            return model
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._models), 'created': self.created, 'evicted': self.evicted}
+
+    def check_key(self, api_key, timeout=10):
+        """
+        Cheap key check: fetch the configured model's metadata instead of generating content
+        Raises the API error for unusable keys
+        """
+        name = self.model_name if self.model_name.startswith('models/') else f'models/{self.model_name}'
+        client = glm.ModelServiceClient(client_options={'api_key': api_key})
+        client.get_model(name=name, retry=None, timeout=timeout)
+
+
+def classify_error(error):
+    """
+    'rate_limited' for quota errors (HTTP 429), 'unavailable' for server-side and
+    network errors worth retrying, None for errors a retry cannot fix
+    """
+    code = getattr(error, 'code', None)
+    if code == 429:
+        return 'rate_limited'
+    if code in (500, 502, 503, 504) or isinstance(error, (ConnectionError, TimeoutError)):
+        return 'unavailable'
+    return None
+
+
+def retry_after(error):
+    """Retry delay in seconds suggested by the API (google.rpc.RetryInfo), or None"""
+    for detail in getattr(error, 'details', None) or ():
+        if isinstance(detail, dict):
+            # REST transport: {'@type': '...RetryInfo', 'retryDelay': '13s'}
+            delay = detail.get('retryDelay')
+            if isinstance(delay, str) and delay.endswith('s'):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    continue
+            continue
+        delay = getattr(detail, 'retry_delay', None)
+        if delay is not None:
+            if hasattr(delay, 'total_seconds'):
+                return delay.total_seconds()
+            return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+class KeyValidationError(Exception):
+    """A key failed validation; cached is True when the failure was answered from the backoff cache"""
+
+    def __init__(self, message, retry_after, cached=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.cached = cached
+
+
+class KeyCheckUnavailable(Exception):
+    """The key could not be checked because of a transient API or network error; nothing is recorded"""
+
+
+class KeyValidator:
+    """
+    Remembers validated keys as salted HMACs for ttl seconds, and failed keys with an
+    exponential backoff (backoff, 2 * backoff, ... up to max_backoff) during which the
+    same key is rejected without another API call. Concurrent checks of one key share a call
+    Errors that say nothing about the key (classify_error: quota, 5xx, network) raise
+    KeyCheckUnavailable and leave the key unknown, so the next attempt checks it again
+    """
+
+    def __init__(self, check, ttl=3600, backoff=2, max_backoff=300, max_size=10000):
+        self.check = check
+        self.ttl = ttl
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_size = max_size
+        self._salt = os.urandom(16)  # per process: digests are useless outside this cache
+        self._valid = OrderedDict()  # digest -> valid until
+        self._failed = OrderedDict()  # digest -> (failures, retry at, message)
+        self._in_flight = {}  # digest -> Event set when the running check finishes
+        self._lock = threading.Lock()
+
+    def _digest(self, api_key):
+        return hmac.new(self._salt, api_key.encode('utf-8'), hashlib.sha256).digest()
+
+    def _remember(self, table, digest, value):
+        """Store an entry, dropping the oldest ones above max_size (lock held)"""
+        table[digest] = value
+        table.move_to_end(digest)
+        while len(table) > self.max_size:
+            table.popitem(last=False)
+
+    def validate(self, api_key):
+        """
+        Return 'cached' or 'checked' for a usable key
+        Raises KeyValidationError for a rejected key, straight from the cache while it is backing off,
+        and KeyCheckUnavailable when the API could not answer
+        """
+        digest = self._digest(api_key)
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                valid_until = self._valid.get(digest)
+                if valid_until is not None and valid_until > now:
+                    return 'cached'
+                failure = self._failed.get(digest)
+                if failure is not None and failure[1] > now:
+                    raise KeyValidationError(failure[2], failure[1] - now, cached=True)
+                event = self._in_flight.get(digest)
+                if event is None:
+                    event = self._in_flight[digest] = threading.Event()
+                    break
+            # Another request is checking this key; use its outcome
+            event.wait()
+
+        try:
+            self.check(api_key)
+        except Exception as e:
+            if classify_error(e):
+                raise KeyCheckUnavailable(str(e)) from e
+            with self._lock:
+                failures = self._failed[digest][0] + 1 if digest in self._failed else 1
+                delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+                self._remember(self._failed, digest, (failures, time.monotonic() + delay, str(e)))
+            raise KeyValidationError(str(e), delay) from e
+        else:
+            with self._lock:
+                self._failed.pop(digest, None)
+                self._remember(self._valid, digest, time.monotonic() + self.ttl)
+            return 'checked'
+        finally:
+            with self._lock:
+                del self._in_flight[digest]
+            event.set()
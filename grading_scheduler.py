@@ -0,0 +1,280 @@
+"""
+Rate-aware grading scheduler
+Runs AI grading calls on a fixed set of worker threads. Each lane (API key and model)
+has a token bucket and an in-flight cap, pending calls are queued per student and served
+round-robin, and transient errors are retried with jittered exponential backoff
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+class TokenBucket:
+    """rate tokens per second up to burst; not thread-safe, the scheduler lock guards it"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Seconds until a token is available, 0 if one is available now"""
+        if self.paused_until > now:
+            return self.paused_until - now
+        if not self.rate:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        if self.rate:
+            self._refill(now)
+            self.tokens -= 1
+
+    def pause(self, seconds, now):
+        """Hand out no tokens for seconds, e.g. after the API reported the quota exhausted"""
+        if self.rate:
+            self._refill(now)
+            self.tokens = 0.0
+        self.paused_until = max(self.paused_until, now + seconds)
+
+    def idle(self, now):
+        """True when the bucket is indistinguishable from a new one"""
+        self._refill(now)
+        return self.paused_until <= now and self.tokens >= self.burst
+
+
+class _Lane:
+    __slots__ = ('bucket', 'running', 'queued')
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.running = 0
+        self.queued = 0
+
+
+class _Task:
+    __slots__ = ('fn', 'future', 'student', 'lane', 'deadline', 'attempts', 'enqueued_at')
+
+    def __init__(self, fn, student, lane, deadline):
+        self.fn = fn
+        self.future = Future()
+        self.student = student
+        self.lane = lane
+        self.deadline = deadline
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+
+
+class GradingScheduler:
+    """
+    Fair, rate limited executor for grading calls
+    rate/burst: token bucket per lane, in calls per second (0 disables the rate limit)
+    max_running: calls in flight per lane
+    classify(error): 'rate_limited' (the lane pauses for the retry delay), another
+    non-empty string for other transient errors, or None for errors that are not retried
+    retry_after(error): optional server-suggested delay in seconds, or None
+    on_wait(seconds): called with the queueing time of each call when it starts
+    Buckets and in-flight counts live in this process only; several processes sharing
+    API keys must each be given their share of the limits
+    The worker threads start with the first submit() of each process: importing the app
+    from a CLI starts none, and a child forked by gunicorn --preload starts its own
+    """
+
+    def __init__(self, workers, rate=0, burst=5, max_running=5, retries=3, backoff=1.0, max_backoff=30.0,
+                 classify=None, retry_after=None, on_wait=None, thread_name_prefix='grading'):
+        self.rate = rate
+        self.burst = burst
+        self.max_running = max_running
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.classify = classify or (lambda error: None)
+        self.retry_after = retry_after or (lambda error: None)
+        self.on_wait = on_wait
+        self.workers = workers
+        self.thread_name_prefix = thread_name_prefix
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        """
+        Empty state without worker threads; also run in a forked child, which inherits
+        the parent's queues and locks but none of its threads
+        """
+        self._queues = OrderedDict()  # student -> deque of tasks, in round-robin order
+        self._delayed = []  # heap of (retry at, seq, task)
+        self._lanes = {}  # lane -> _Lane
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None  # process the worker threads were started in
+        self.counts = {'submitted': 0, 'completed': 0, 'failed': 0, 'cancelled': 0, 'retried': 0, 'rate_limited': 0}
+
+    def _start_workers(self):
+        """Start the worker threads unless this process has them already (lock held)"""
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        for number in range(self.workers):
+            threading.Thread(target=self._work, name=f'{self.thread_name_prefix}_{number}', daemon=True).start()
+        self._pid = pid
+
+    def submit(self, fn, student, lane, deadline=None):
+        """
+        Queue fn() for the student on lane; returns a Future
+        No retry is started after deadline (a time.monotonic() value); cancel the Future to drop a queued call
+        """
+        task = _Task(fn, student, lane, deadline)
+        with self._cond:
+            self._start_workers()
+            self._lane(lane).queued += 1
+            self._queues.setdefault(student, deque()).append(task)
+            self.counts['submitted'] += 1
+            self._cond.notify()
+        return task.future
+
+    def _lane(self, lane):
+        """The lane's state, created on first use; idle lanes are dropped on the way (lock held)"""
+        state = self._lanes.get(lane)
+        if state is None:
+            now = time.monotonic()
+            for key in [key for key, other in self._lanes.items()
+                        if not other.running and not other.queued and other.bucket.idle(now)]:
+                del self._lanes[key]
+            state = self._lanes[lane] = _Lane(TokenBucket(self.rate, self.burst))
+        return state
+
+    def _next_task(self):
+        """
+        Pop the next runnable task, visiting students round-robin (lock held)
+        Returns (task, None), or (None, seconds to wait before looking again)
+        """
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            task = heapq.heappop(self._delayed)[2]
+            # A retry goes ahead of the student's other work
+            self._queues.setdefault(task.student, deque()).appendleft(task)
+        wake = self._delayed[0][0] - now if self._delayed else None
+
+        for student in list(self._queues):
+            queue = self._queues[student]
+            while queue and queue[0].future.cancelled():
+                self._drop(queue.popleft())
+            if not queue:
+                del self._queues[student]
+                continue
+
+            task = queue[0]
+            lane = self._lanes[task.lane]
+            if lane.running >= self.max_running:
+                continue  # woken up again when one of the lane's calls finishes
+            wait = lane.bucket.wait_time(now)
+            if wait > 0:
+                wake = wait if wake is None else min(wake, wait)
+                continue
+
+            queue.popleft()
+            if queue:
+                self._queues.move_to_end(student)
+            else:
+                del self._queues[student]
+            if task.attempts == 0 and not task.future.set_running_or_notify_cancel():
+                self._drop(task)
+                continue
+            lane.queued -= 1
+            lane.running += 1
+            lane.bucket.take(now)
+            return task, None
+        return None, wake
+
+    def _drop(self, task):
+        """Forget a cancelled task (lock held)"""
+        self._lanes[task.lane].queued -= 1
+        self.counts['cancelled'] += 1
+
+    def _work(self):
+        while True:
+            with self._cond:
+                task, wake = self._next_task()
+                while task is None:
+                    self._cond.wait(wake)
+                    task, wake = self._next_task()
+            self._run(task)
+
+    def _run(self, task):
+        if task.attempts == 0 and self.on_wait:
+            self.on_wait(time.monotonic() - task.enqueued_at)
+        try:
+            result = task.fn()
+        except Exception as e:
+            error = e
+        else:
+            error = None
+
+        with self._cond:
+            lane = self._lanes[task.lane]
+            lane.running -= 1
+            delay = self._retry_delay(task, error) if error is not None else None
+            if delay is not None:
+                lane.queued += 1
+                task.attempts += 1
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), task))
+            else:
+                self.counts['failed' if error is not None else 'completed'] += 1
+            self._cond.notify_all()
+
+        if delay is None:
+            if error is not None:
+                task.future.set_exception(error)
+            else:
+                task.future.set_result(result)
+
+    def _retry_delay(self, task, error):
+        """Seconds before the next attempt, or None when the error is final (lock held)"""
+        kind = self.classify(error)
+        if not kind or task.attempts >= self.retries:
+            return None
+        # Full jitter over the upper half of the exponential step keeps a spike of retries spread out
+        step = min(self.max_backoff, self.backoff * 2 ** task.attempts)
+        delay = random.uniform(step / 2, step)
+        suggested = self.retry_after(error)
+        if suggested:
+            delay = max(delay, min(self.max_backoff, suggested))
+        now = time.monotonic()
+        if task.deadline is not None and now + delay > task.deadline:
+            return None
+        if kind == 'rate_limited':
+            # The whole lane is out of quota, not just this call
+            self._lanes[task.lane].bucket.pause(delay, now)
+            self.counts['rate_limited'] += 1
+        self.counts['retried'] += 1
+        return delay
+
+    def stats(self):
+        """Queue depth, running calls, waiting students and the oldest queued call's wait in seconds"""
+        now = time.monotonic()
+        with self._cond:
+            heads = [queue[0].enqueued_at for queue in self._queues.values() if queue]
+            return dict(
+                self.counts,
+                queued=sum(lane.queued for lane in self._lanes.values()),
+                delayed=len(self._delayed),
+                running=sum(lane.running for lane in self._lanes.values()),
+                students=len(self._queues),
+                lanes=len(self._lanes),
+                oldest_wait=now - min(heads) if heads else 0.0
+            )
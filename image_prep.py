@@ -0,0 +1,62 @@
+"""
+Image preprocessing for answers sent to the AI grader
+Downscales, flattens and re-encodes uploads once and caches the result next to the original
+"""
+
+import os
+import tempfile
+
+from PIL import Image, ImageOps
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp', 'PNG': 'png'}
+PREP_VERSION = 2  # part of the derivative name: bump when the processing changes so old copies are rebuilt
+
+
+def derivative_path(path, fmt, max_side, quality, grayscale):
+    """
+    Path of the processed copy of an image, e.g. photo.png -> photo.model2-1600q80.jpg
+    The settings are part of the name, so changing them builds new copies instead of reusing old ones
+    """
+    stem, _ = os.path.splitext(path)
+    settings = f'{max_side}q{quality}' + ('g' if grayscale else '')
+    return f'{stem}.model{PREP_VERSION}-{settings}.{FORMAT_EXTENSIONS[fmt]}'
+
+
+def prepare_image(path, max_side=1600, fmt='JPEG', quality=80, grayscale=False):
+    """
+    Return the path of a model-ready copy of the image at path
+    The copy fits in max_side x max_side, has EXIF stripped (after applying its
+    orientation) and is re-encoded as fmt; it is only rebuilt when the original is newer
+    or no copy with these settings exists yet
+    """
+    fmt = fmt.upper()
+    target = derivative_path(path, fmt, max_side, quality, grayscale)
+    if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Canvas drawings are transparent PNGs - flatten onto white, before any grayscale
+            # conversion, which would drop the alpha and turn the transparent background black
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.split()[-1])
+        if grayscale:
+            image = image.convert('L')
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Write to a temp file first so concurrent workers never read a half-written copy
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format=fmt, quality=quality, optimize=True)
+            os.replace(tmp_path, target)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    return target
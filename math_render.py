@@ -0,0 +1,61 @@
+"""
+Server-side rendering of LaTeX in question texts
+Converts the \\(...\\), \\[...\\], $...$ and $$...$$ fragments MathJax would typeset into
+static MathML once, so exam pages do not have to typeset questions in the browser
+Needs the optional latex2mathml package; without it every text falls back to MathJax
+"""
+
+import html
+import re
+
+try:
+    from latex2mathml.converter import convert as latex_to_mathml
+except ImportError:  # pragma: no cover - optional dependency
+    latex_to_mathml = None
+
+# Same delimiters as the MathJax config in templates/exam.html; \$ is a literal dollar
+MATH_RE = re.compile(
+    r'\$\$(?P<display1>.+?)\$\$'
+    r'|\\\[(?P<display2>.+?)\\\]'
+    r'|\\\((?P<inline1>.+?)\\\)'
+    r'|(?<!\\)\$(?P<inline2>.+?)(?<!\\)\$',
+    re.DOTALL
+)
+
+# Custom macros from the MathJax config
+MACROS = {
+    'RR': r'\mathbb{R}',
+    'NN': r'\mathbb{N}',
+    'ZZ': r'\mathbb{Z}',
+    'QQ': r'\mathbb{Q}',
+    'CC': r'\mathbb{C}',
+}
+MACRO_RE = re.compile(r'\\(%s)(?![A-Za-z])' % '|'.join(MACROS))
+
+
+def has_math(text):
+    return bool(text) and MATH_RE.search(text) is not None
+
+
+def render_math(text):
+    """
+    Return text with every math fragment replaced by MathML
+    Returns None when the text has math that cannot be rendered here, so callers keep MathJax for it
+    """
+    if not text or not has_math(text):
+        return text and text.replace(r'\$', '$')
+    if latex_to_mathml is None:
+        return None
+
+    def replace(match):
+        display = match.group('display1') is not None or match.group('display2') is not None
+        latex = next(group for group in match.groups() if group is not None)
+        # Question texts are HTML, so entities inside math stand for plain characters
+        latex = MACRO_RE.sub(lambda m: MACROS[m.group(1)], html.unescape(latex))
+        return latex_to_mathml(latex.strip(), display='block' if display else 'inline')
+
+    try:
+        rendered = MATH_RE.sub(replace, text)
+    except Exception:
+        return None
+    return rendered.replace(r'\$', '$')
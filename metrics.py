@@ -0,0 +1,127 @@
+"""
+In-process metrics
+Counters and fixed-bucket histograms rendered in the Prometheus text format, plus
+per-request timing totals for the Server-Timing header
+Values are per process; with several gunicorn workers each one is scraped separately
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms, keyed by name and label values"""
+
+    def __init__(self, namespace, buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._request = threading.local()
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, timing=None, **labels):
+        """
+        Record a duration in the histogram name
+        timing: also add it to this entry of the current request's Server-Timing
+        """
+        key = (name, tuple(sorted(labels.items())))
+        slot = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0] * (len(self.buckets) + 3)
+            values[slot] += 1  # slot len(buckets) is +Inf
+            values[-2] += seconds
+            values[-1] += 1
+        if timing is not None:
+            timings = getattr(self._request, 'timings', None)
+            if timings is not None:
+                timings[timing] = timings.get(timing, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name, timing=None, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, timing=timing, **labels)
+
+    def add_collector(self, collect):
+        """collect() returns (name, kind, labels dict, value) tuples read at scrape time"""
+        self._collectors.append(collect)
+
+    def start_request(self):
+        """Start collecting Server-Timing entries for the request handled by this thread"""
+        self._request.timings = {}
+
+    def end_request(self):
+        """Stop collecting and return the request's {entry: seconds}"""
+        timings = getattr(self._request, 'timings', None) or {}
+        self._request.timings = None
+        return timings
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, list(values)) for key, values in self._histograms.items())
+
+        samples = {}  # full name -> (kind, [lines])
+        for (name, labels), value in counters:
+            full = f'{self.namespace}_{name}'
+            samples.setdefault(full, ('counter', []))[1].append(f'{full}{_format_labels(labels)} {value}')
+
+        for (name, labels), values in histograms:
+            full = f'{self.namespace}_{name}'
+            lines = samples.setdefault(full, ('histogram', []))[1]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{full}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{full}_sum{_format_labels(labels)} {values[-2]}')
+            lines.append(f'{full}_count{_format_labels(labels)} {values[-1]}')
+
+        for collect in self._collectors:
+            for name, kind, labels, value in collect():
+                full = f'{self.namespace}_{name}'
+                line = f'{full}{_format_labels(tuple(sorted(labels.items())))} {value}'
+                samples.setdefault(full, (kind, []))[1].append(line)
+
+        output = []
+        for full, (kind, lines) in samples.items():
+            name = full[len(self.namespace) + 1:]
+            if name in self._help:
+                output.append(f'# HELP {full} {self._help[name]}')
+            output.append(f'# TYPE {full} {kind}')
+            output.extend(lines)
+        return '\n'.join(output) + '\n'
+
+
+def server_timing_header(timings):
+    """Format {entry: seconds} as a Server-Timing header value"""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
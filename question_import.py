@@ -0,0 +1,190 @@
+"""
+Question Bank Import
+Streams questions from JSON / JSON Lines / CSV / YAML files and upserts them in
+batches on a stable question key, so imports can be rerun without losing results
+
+Each record needs: subject, text, difficulty ('Easy', 'Medium' or 'Hard')
+and may carry its own key; otherwise the key is derived from subject and text.
+
+Usage: python question_import.py FILE [FILE ...] [--batch-size 1000] [--subject NAME]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+
+from app import (app, db, Subject, Question, clean_for_ai, derive_question_texts, invalidate_question_index,
+                 upgrade_database)
+from math_render import render_math
+
+DIFFICULTIES = ('Easy', 'Medium', 'Hard')
+
+
+def question_key(subject_name, text):
+    """Stable key for a question: subject name plus whitespace-normalized text"""
+    material = subject_name.strip() + '\0' + ' '.join(text.split())
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def read_questions(path, default_subject=None):
+    """Yield question records from a .json, .jsonl, .csv, .yaml or .yml file"""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8', newline='') as f:
+        if extension == '.jsonl':
+            records = (json.loads(line) for line in f if line.strip())
+        elif extension == '.json':
+            records = json.load(f)
+        elif extension == '.csv':
+            records = csv.DictReader(f)
+        elif extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise SystemExit("YAML import needs PyYAML: pip install pyyaml")
+            records = yaml.safe_load(f) or []
+        else:
+            raise SystemExit(f"Unsupported file type: {path}")
+
+        for record in records:
+            if default_subject and not record.get('subject'):
+                record['subject'] = default_subject
+            yield record
+
+
+def question_row(subject_id, text, difficulty, key):
+    """Column values stored for an imported question"""
+    return {
+        'subject_id': subject_id,
+        'text': text,
+        'difficulty': difficulty,
+        'key': key,
+        'text_html': render_math(text),
+        'ai_text': clean_for_ai(text)
+    }
+
+
+class QuestionImporter:
+    """Upserts question records in batches; counts what happened to each record"""
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.subject_ids = {subject.name: subject.id for subject in Subject.query.all()}
+        self.stats = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+
+    def subject_id(self, name):
+        """Id of the subject with this name, creating the subject if needed"""
+        if name not in self.subject_ids:
+            subject = Subject(name=name)
+            db.session.add(subject)
+            db.session.flush()
+            self.subject_ids[name] = subject.id
+        return self.subject_ids[name]
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.stats
+
+    def import_batch(self, records):
+        rows = {}
+        for record in records:
+            subject = str(record.get('subject') or '').strip()
+            text = str(record.get('text') or '').strip()
+            difficulty = str(record.get('difficulty') or '').strip().capitalize()
+            if not subject or not text or difficulty not in DIFFICULTIES:
+                self.stats['skipped'] += 1
+                continue
+            key = str(record.get('key') or question_key(subject, text))
+            if len(key) > 64:
+                key = hashlib.sha256(key.encode('utf-8')).hexdigest()
+            rows[key] = question_row(self.subject_id(subject), text, difficulty, key)  # last one wins
+
+        existing = {
+            row.key: row for row in db.session.query(
+                Question.id, Question.key, Question.subject_id, Question.text, Question.difficulty, Question.text_html,
+                Question.ai_text
+            ).filter(Question.key.in_(list(rows)))
+        }
+
+        inserts, updates = [], []
+        for key, row in rows.items():
+            current = existing.get(key)
+            if current is None:
+                inserts.append(row)
+            elif any(getattr(current, column) != value for column, value in row.items()):
+                updates.append(dict(row, id=current.id))
+            else:
+                self.stats['unchanged'] += 1
+
+        if inserts:
+            db.session.bulk_insert_mappings(Question, inserts)
+        if updates:
+            db.session.bulk_update_mappings(Question, updates)
+        db.session.commit()
+
+        self.stats['inserted'] += len(inserts)
+        self.stats['updated'] += len(updates)
+
+
+def backfill_question_keys(batch_size=1000):
+    """Give questions created before keys existed their derived key, so imports match them"""
+    subject_names = {subject.id: subject.name for subject in Subject.query.all()}
+    filled = 0
+    while True:
+        rows = db.session.query(Question.id, Question.subject_id, Question.text).filter(
+            Question.key.is_(None)
+        ).limit(batch_size).all()
+        if not rows:
+            return filled
+        keys = {row.id: question_key(subject_names[row.subject_id], row.text) for row in rows}
+        taken = {key for (key,) in db.session.query(Question.key).filter(Question.key.in_(list(keys.values())))}
+        for row in rows:
+            if keys[row.id] in taken:
+                # Duplicate text in the same subject: keep the rows apart
+                keys[row.id] = question_key(subject_names[row.subject_id], f'{row.text}\0{row.id}')
+            taken.add(keys[row.id])
+        db.session.bulk_update_mappings(Question, [{'id': question_id, 'key': key} for question_id, key in keys.items()])
+        db.session.commit()
+        filled += len(rows)
+
+
+def import_questions(records, batch_size=1000):
+    """Upsert question records inside an app context; returns the import statistics"""
+    with app.app_context():
+        db.create_all()
+        upgrade_database()
+        backfill_question_keys(batch_size)
+        derive_question_texts(batch_size)
+        stats = QuestionImporter(batch_size).run(records)
+        invalidate_question_index()
+        return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--subject', help='subject for records that have none')
+    args = parser.parse_args()
+
+    for path in args.files:
+        start = time.perf_counter()
+        stats = import_questions(read_questions(path, args.subject), args.batch_size)
+        elapsed = time.perf_counter() - start
+        processed = stats['inserted'] + stats['updated'] + stats['unchanged']
+        print(f"{path}: {stats['inserted']} əlavə edildi, {stats['updated']} yeniləndi, "
+              f"{stats['unchanged']} dəyişməyib, {stats['skipped']} buraxıldı "
+              f"({processed / elapsed if elapsed else 0:.0f} sual/s)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+"""
+Score Statistics Rebuild
+Recomputes the per-question and per-subject statistics tables from the graded results.
+The app keeps them current on every grading commit; run this after editing results or
+answers directly in the database, or to check the incremental totals for drift.
+
+Usage: python rebuild_stats.py
+"""
+import argparse
+import sys
+import time
+
+from app import app, db, rebuild_score_stats, upgrade_database
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+
+    with app.app_context():
+        db.create_all()
+        upgrade_database()
+        start = time.perf_counter()
+        counts = rebuild_score_stats()
+        elapsed = time.perf_counter() - start
+        print(f"Statistika yeniləndi: {counts['questions']} sual, {counts['subjects']} fənn, "
+              f"{counts['histogram_rows']} histoqram sətri ({elapsed:.2f} s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
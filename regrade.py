@@ -0,0 +1,264 @@
+"""
+Bulk Re-grading
+Re-scores stored answers after a change to the grading prompt or model. Answers are
+streamed in id order in chunks, graded in parallel on the grading scheduler and written
+back with bulk updates; Result totals and the statistics tables are updated for every chunk. Progress is
+checkpointed to a file after each chunk, so an interrupted run continues where it stopped
+
+Answers the model could not grade, because the call failed or the reply had no score,
+keep their old points, are not cached and are listed at the end.
+
+Usage: python regrade.py --api-key KEY [--subject NAME|ID] [--since 2025-01-01] [--until 2025-02-01]
+           [--result-ids 100-200] [--chunk-size 200] [--concurrency 5] [--rate-per-minute 0]
+           [--checkpoint regrade.checkpoint.json] [--restart] [--dry-run]
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from concurrent.futures import wait
+from datetime import datetime
+
+from answer_images import answer_image_refs
+from app import (app, db, Answer, Question, Result, Subject, GradeParseError, calculate_points, clean_for_ai,
+                 grade_cache_key, grading_lane, grading_scheduler, record_score_stats, request_ai_grade, results_committed,
+                 store_grade_cache)
+
+# Rough token counts for the cost estimate: prompt template, and Gemini's flat rate per image
+PROMPT_TOKENS = 150
+IMAGE_TOKENS = 258
+CHARS_PER_TOKEN = 4
+
+
+def parse_id_range(text):
+    """'100-200' -> (100, 200); either end may be left out"""
+    low, _, high = text.partition('-')
+    return (int(low) if low else None, int(high) if high else None)
+
+
+def answer_query(filters, after_id):
+    """Answers of graded results matching the filters with ids above after_id, in id order"""
+    query = db.session.query(
+        Answer.id, Answer.result_id, Answer.question_id, Answer.answer_text, Answer.image_path, Answer.points,
+        Answer.max_points, Question.ai_text, Question.text
+    ).join(Result, Answer.result_id == Result.id).join(Question, Answer.question_id == Question.id).filter(
+        Result.status == 'graded',
+        Answer.status == 'graded',
+        Answer.id > after_id
+    )
+    if filters['subject_id'] is not None:
+        query = query.filter(Result.subject_id == filters['subject_id'])
+    if filters['since']:
+        query = query.filter(Result.exam_date >= datetime.fromisoformat(filters['since']))
+    if filters['until']:
+        query = query.filter(Result.exam_date < datetime.fromisoformat(filters['until']))
+    low, high = filters['result_ids']
+    if low is not None:
+        query = query.filter(Result.id >= low)
+    if high is not None:
+        query = query.filter(Result.id <= high)
+    return query.order_by(Answer.id)
+
+
+def estimate_tokens(question_text, answer_text, image_count, feedback=''):
+    """(input, output) token estimate of one grading call"""
+    input_tokens = PROMPT_TOKENS + (len(question_text) + len(answer_text)) // CHARS_PER_TOKEN
+    return input_tokens + image_count * IMAGE_TOKENS, len(feedback) // CHARS_PER_TOKEN
+
+
+class Regrader:
+    """Grades chunks of answers and writes the new grades; keeps running totals for the report"""
+
+    def __init__(self, api_key, input_price, output_price):
+        self.api_key = api_key
+        self.input_price = input_price  # USD per million tokens
+        self.output_price = output_price
+        self.lane = grading_lane(api_key)
+        self.stats = {'graded': 0, 'failed': 0, 'unparsable': 0, 'input_tokens': 0, 'output_tokens': 0}
+        self.failed_ids = []
+
+    @property
+    def cost(self):
+        return (self.stats['input_tokens'] * self.input_price + self.stats['output_tokens'] * self.output_price) / 1e6
+
+    def grade_chunk(self, rows):
+        """Grade rows in parallel and commit their new points, feedback, Result totals and statistics"""
+        texts = [row.ai_text if row.ai_text is not None else clean_for_ai(row.text) for row in rows]
+        futures = [
+            grading_scheduler.submit(
+                functools.partial(request_ai_grade, text, row.answer_text, row.image_path, self.api_key),
+                student='regrade',
+                lane=self.lane
+            )
+            for row, text in zip(rows, texts)
+        ]
+        try:
+            wait(futures)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            raise
+
+        updates, fresh = [], {}
+        for row, text, future in zip(rows, texts, futures):
+            if future.exception() is not None:
+                # Keep the old grade rather than writing a placeholder
+                if isinstance(future.exception(), GradeParseError):
+                    self.stats['unparsable'] += 1
+                self.stats['failed'] += 1
+                self.failed_ids.append(row.id)
+                continue
+            feedback = future.result()
+            updates.append({'id': row.id, 'points': calculate_points(feedback, row.max_points), 'feedback': feedback})
+            key = grade_cache_key(row.question_id, text, row.answer_text, row.image_path)
+            fresh[key] = (row.question_id, feedback)
+            images = len(answer_image_refs(row.answer_text)) + (1 if row.image_path else 0)
+            input_tokens, output_tokens = estimate_tokens(text, clean_for_ai(row.answer_text), images, feedback)
+            self.stats['input_tokens'] += input_tokens
+            self.stats['output_tokens'] += output_tokens
+
+        if updates:
+            new_points = {update['id']: update['points'] for update in updates}
+            changed = [row for row in rows if row.id in new_points]
+            before = db.session.query(Result.id, Result.subject_id, Result.total_score).filter(
+                Result.id.in_({row.result_id for row in changed})
+            ).all()
+            subject_ids = {result_id: subject_id for result_id, subject_id, _ in before}
+
+            db.session.bulk_update_mappings(Answer, updates)
+            totals = db.session.query(Answer.result_id, db.func.coalesce(db.func.sum(Answer.points), 0)).filter(
+                Answer.result_id.in_(subject_ids)
+            ).group_by(Answer.result_id).all()
+            db.session.bulk_update_mappings(Result, [
+                {'id': result_id, 'total_score': total} for result_id, total in totals
+            ])
+            # Swap the old scores for the new ones in the statistics tables
+            record_score_stats(
+                [(row.question_id, row.points, row.max_points) for row in changed],
+                [(subject_id, total) for _, subject_id, total in before],
+                sign=-1
+            )
+            record_score_stats(
+                [(row.question_id, new_points[row.id], row.max_points) for row in changed],
+                [(subject_ids[result_id], total) for result_id, total in totals]
+            )
+            if app.config['GRADE_CACHE_ENABLED']:
+                store_grade_cache(fresh)
+        db.session.commit()
+        self.stats['graded'] += len(updates)
+
+
+def load_checkpoint(path, filters, restart):
+    """Answer id to continue after, plus the stats and failures of the earlier run"""
+    if restart or not os.path.exists(path):
+        return 0, None, []
+    with open(path, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint['filters'] != filters:
+        raise SystemExit(f"{path} başqa filtrlərlə yaradılıb; yenidən başlamaq üçün --restart istifadə edin")
+    return checkpoint['last_answer_id'], checkpoint['stats'], checkpoint['failed_ids']
+
+
+def save_checkpoint(path, filters, last_answer_id, regrader):
+    """Write the checkpoint atomically so a crash never leaves half a file"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'filters': filters,
+            'last_answer_id': last_answer_id,
+            'stats': regrader.stats,
+            'failed_ids': regrader.failed_ids,
+            'updated_at': datetime.utcnow().isoformat(timespec='seconds')
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def resolve_subject(value):
+    """Subject id from an id or a name"""
+    if value is None:
+        return None
+    subject = db.session.get(Subject, int(value)) if value.isdigit() else Subject.query.filter_by(name=value).first()
+    if subject is None:
+        raise SystemExit(f"Fənn tapılmadı: {value}")
+    return subject.id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--api-key', default=os.environ.get('GEMINI_API_KEY'), help='defaults to $GEMINI_API_KEY')
+    parser.add_argument('--subject', help='subject name or id')
+    parser.add_argument('--since', help='exams on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='exams before this date (YYYY-MM-DD)')
+    parser.add_argument('--result-ids', type=parse_id_range, default=(None, None), help='result id range, e.g. 100-200')
+    parser.add_argument('--chunk-size', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, help='grading calls in flight (default: this process\'s share of '
+                                                          'GRADING_MAX_INFLIGHT_PER_KEY)')
+    parser.add_argument('--rate-per-minute', type=float, help='grading calls per minute, 0 for no limit '
+                                                              '(default: this process\'s share of GRADING_RATE_PER_MINUTE)')
+    parser.add_argument('--input-price', type=float, default=0.30, help='USD per million input tokens')
+    parser.add_argument('--output-price', type=float, default=2.50, help='USD per million output tokens')
+    parser.add_argument('--checkpoint', default='regrade.checkpoint.json')
+    parser.add_argument('--restart', action='store_true', help='ignore an existing checkpoint')
+    parser.add_argument('--dry-run', action='store_true', help='only count the matching answers')
+    args = parser.parse_args()
+
+    if not args.api_key and not args.dry_run:
+        parser.error('--api-key or GEMINI_API_KEY is required')
+    if args.concurrency:
+        grading_scheduler.max_running = args.concurrency
+    if args.rate_per_minute is not None:
+        grading_scheduler.rate = args.rate_per_minute / 60
+
+    with app.app_context():
+        filters = {
+            'subject_id': resolve_subject(args.subject),
+            'since': args.since,
+            'until': args.until,
+            'result_ids': list(args.result_ids)
+        }
+        if args.dry_run:
+            print(f"{answer_query(filters, 0).count()} cavab yenidən qiymətləndiriləcək")
+            return 0
+
+        last_id, stats, failed_ids = load_checkpoint(args.checkpoint, filters, args.restart)
+        regrader = Regrader(args.api_key, args.input_price, args.output_price)
+        if stats:
+            regrader.stats.update(stats)
+            regrader.failed_ids = failed_ids
+            print(f"Davam edilir: cavab #{last_id}-dən sonra ({stats['graded']} artıq qiymətləndirilib)")
+
+        start = time.perf_counter()
+        graded_before = regrader.stats['graded'] + regrader.stats['failed']
+        try:
+            while True:
+                rows = answer_query(filters, last_id).limit(args.chunk_size).all()
+                if not rows:
+                    break
+                regrader.grade_chunk(rows)
+                last_id = rows[-1].id
+                save_checkpoint(args.checkpoint, filters, last_id, regrader)
+
+                done = regrader.stats['graded'] + regrader.stats['failed'] - graded_before
+                elapsed = time.perf_counter() - start
+                print(f"#{last_id}: {regrader.stats['graded']} qiymətləndirildi, {regrader.stats['failed']} alınmadı, "
+                      f"{done / elapsed if elapsed else 0:.1f} cavab/s, ~${regrader.cost:.4f}", flush=True)
+        except KeyboardInterrupt:
+            db.session.rollback()
+            print(f"\nDayandırıldı; yenidən işə salınsa cavab #{last_id}-dən sonra davam edəcək")
+            return 130
+        finally:
+            # Only this process's caches; the web workers pick the new totals up after their TTLs
+            results_committed()
+
+        print(f"Hazırdır: {regrader.stats['graded']} cavab yeniləndi, "
+              f"təxmini xərc ${regrader.cost:.4f}")
+        if regrader.failed_ids:
+            print(f"Qiymətləndirilə bilməyən cavablar (köhnə xal saxlanıldı, {regrader.stats['unparsable']} "
+                  f"cavabda xal tapılmadı): {regrader.failed_ids}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Text normalization for AI grading prompts
+Rewrites \\(...\\) and \\[...\\] math as $...$, drops the remaining backslashes and
+collapses whitespace in one tokenizing pass over a length-bounded input
+"""
+
+import re
+
+MAX_AI_TEXT_CHARS = 20000
+
+# A math delimiter (with any backslashes before it) or a line break; other backslashes are dropped afterwards
+TOKEN_RE = re.compile(r'((?<!\\)\\+[()\[\]]|\n)')
+WHITESPACE_RE = re.compile(r'\s+')
+OPENERS = {'(': ')', '[': ']'}
+CLOSERS = {')': '(', ']': '['}
+
+
+def normalize_for_ai(text, max_chars=MAX_AI_TEXT_CHARS):
+    """
+    Clean LaTeX and text for AI processing
+    Matches the old four-regex clean_for_ai: a delimiter pair on one line becomes $...$,
+    unpaired delimiters lose their backslash. Input beyond max_chars is dropped
+    """
+    if not text:
+        return ""
+    if max_chars and len(text) > max_chars:
+        text = text[:max_chars]
+    if '\\' not in text:
+        return WHITESPACE_RE.sub(' ', text).strip()
+
+    # Capturing split: even items are plain text, odd items are delimiters or line breaks
+    parts = TOKEN_RE.split(text)
+    open_at = {}  # opening delimiter -> index of its placeholder in parts
+    for i in range(1, len(parts), 2):
+        token = parts[i]
+        if token == '\n':
+            # Delimiter pairs never span lines
+            open_at.clear()
+            continue
+
+        delimiter = token[-1]
+        if delimiter in OPENERS:
+            if delimiter not in open_at:
+                open_at[delimiter] = i
+            parts[i] = delimiter
+        else:
+            opener = CLOSERS[delimiter]
+            if opener in open_at:
+                parts[open_at.pop(opener)] = '$'
+                parts[i] = '$'
+            else:
+                parts[i] = delimiter
+
+    return WHITESPACE_RE.sub(' ', ''.join(parts).replace('\\', '')).strip()
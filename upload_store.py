@@ -0,0 +1,133 @@
+"""
+Content-addressed storage for uploaded answer images
+Uploads are streamed to a temp file while being hashed and stored once under
+their sha256 digest, so identical images are deduplicated
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+ALLOWED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp'}
+CHUNK_SIZE = 64 * 1024
+HASH_NAME_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def too_large(max_bytes):
+    """413 error for a file above the per-file limit"""
+    return RequestEntityTooLarge(f'Fayl {max_bytes / (1024 * 1024):g}MB-dan böyük ola bilməz')
+
+
+class HashingUploadFile:
+    """
+    Writable temp file that hashes and size-checks data as it arrives
+    Used as the multipart stream factory. A file above max_bytes is truncated and the
+    rest of it discarded unwritten, so only that upload is rejected (store_upload raises)
+    and the other fields of the form are still parsed. close() removes the temp file
+    unless it was stored
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.stored = False
+        self.oversized = False
+        fd, self.path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.tmp')
+        self._file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.oversized:
+            return len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.oversized = True
+            self._file.seek(0)
+            self._file.truncate()
+            return len(data)
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def close(self):
+        self._file.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def is_content_addressed(filename):
+    """True for names produced by store_upload, i.e. '<sha256>.<ext>'"""
+    return bool(HASH_NAME_RE.match(os.path.splitext(filename)[0]))
+
+
+def _commit(tmp_path, digest, extension, folder):
+    """Move a fully written temp file to its content address, dropping it if already stored"""
+    filename = digest + extension
+    target = os.path.join(folder, filename)
+    if os.path.exists(target):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, target)
+    return filename
+
+
+def store_upload(file_storage, folder, max_bytes):
+    """
+    Store an uploaded image under its content hash
+    Returns the stored filename, or None for empty uploads and disallowed file types;
+    raises RequestEntityTooLarge for a file above max_bytes
+    """
+    extension = os.path.splitext(file_storage.filename or '')[1].lower()
+    if extension not in ALLOWED_EXTENSIONS:
+        return None
+
+    stream = file_storage.stream
+    if isinstance(stream, HashingUploadFile):
+        if stream.oversized:
+            raise too_large(stream.max_bytes)
+        if stream.size == 0:
+            return None
+        stream.flush()
+        stream.stored = True
+        return _commit(stream.path, stream.digest.hexdigest(), extension, folder)
+
+    # Uploads that were not parsed through HashingUploadFile are copied chunk by chunk
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise too_large(max_bytes)
+                digest.update(chunk)
+                f.write(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    if size == 0:
+        os.remove(tmp_path)
+        return None
+    return _commit(tmp_path, digest.hexdigest(), extension, folder)
+
+
+def store_bytes(data, extension, folder):
+    """Store an in-memory image, e.g. one decoded from a data URI, under its content hash"""
+    digest = hashlib.sha256(data).hexdigest()
+    if os.path.exists(os.path.join(folder, digest + extension)):
+        return digest + extension
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return _commit(tmp_path, digest, extension, folder)